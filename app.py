@@ -1,9 +1,28 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, abort, render_template, session, stream_with_context, g
 from flask_cors import CORS
-from models import db, Player, Game, GameParticipant, Region
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from models import db, Player, Game, GameParticipant, Region, apply_sqlite_pragmas, on_primary
 from rating_system import rating_system
+from bulk_import import import_games, parse_stream, parse_timestamp, normalize_game
+from replay import recompute_ratings, rewrite_game
+from matchmaking import assign_round
+from simulator import simulate, SCENARIOS
+from submission_queue import submission_queue
+from export import export_games, export_players, MIMETYPES as EXPORT_MIMETYPES
+from history import history_cache, downsample
+from leaderboard import get_leaderboard_rows, get_player_rank, leaderboard_snapshot, log_changes
+from checkpoints import leaderboard_as_of
+from head_to_head import rivals, versus, SORT_COLUMNS as RIVAL_SORTS
+from region_stats import region_stats, rating_buckets, update_histogram, PERIODS as STATS_PERIODS
+from serialization import select_players, player_row, encode, games_json, game_cache, select_game_keys
 from config import Config
+from cache import response_cache
+from broadcaster import leaderboard_broadcaster
+from instrumentation import instrumentation
 from functools import wraps
+import io
+import math
 from datetime import datetime
 
 app = Flask(__name__)
@@ -12,6 +31,12 @@ CORS(app)
 
 # Initialize database
 db.init_app(app)
+with app.app_context():
+    for engine in db.engines.values():
+        apply_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+    instrumentation.init_app(app, *db.engines.values())
+response_cache.init_app(app, db)
+leaderboard_broadcaster.init_app(app)
 
 
 def admin_required(f):
@@ -24,6 +49,68 @@ def admin_required(f):
     return decorated_function
 
 
+def replica_reads(f):
+    """Run a public read on DATABASE_REPLICA_URL, unless an admin is logged in (read-your-writes)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_replica = not session.get('admin_logged_in')
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def rating_writes(f):
+    """Hold off the submission writer while the view rewrites ratings outside the queue"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with submission_queue.exclusive():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+def is_number(value):
+    """True for finite JSON numbers (booleans excluded)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def synced_snapshot():
+    """Leaderboard snapshot, caught up first if another worker changed ratings"""
+    # Built from the primary so replica lag never outlives the request in the snapshot
+    with on_primary():
+        leaderboard_snapshot.sync(response_cache.version())
+        leaderboard_snapshot.ensure_built()
+    return leaderboard_snapshot
+
+
+def publish_changes(updated=(), removed=(), rebuild=False, games=()):
+    """Propagate a committed write to the snapshot and the response cache
+
+    `games` lists existing games whose participants were rewritten.
+    """
+    version = response_cache.bump_version()
+    if app.config['LEADERBOARD_SNAPSHOT']:
+        log_changes(version, [p.id for p in updated] + list(removed), rebuild)
+    # A snapshot that missed another worker's write catches up before it is patched
+    leaderboard_snapshot.sync(version - 1)
+    if rebuild:
+        leaderboard_snapshot.invalidate()
+    if removed:
+        leaderboard_snapshot.remove_players(removed)
+    if updated:
+        if not rebuild:
+            leaderboard_snapshot.ensure_built()
+        changes = leaderboard_snapshot.update_players(updated)
+        if changes and not rebuild and not removed:
+            leaderboard_broadcaster.publish({'type': 'ranks', 'version': version, 'players': changes})
+    if rebuild or removed:
+        leaderboard_broadcaster.publish({'type': 'reset', 'version': version})
+    leaderboard_snapshot.advance(version)
+    history_cache.advance(version, None if rebuild else [p.id for p in updated] + list(removed))
+    game_cache.discard(games)
+
+
+submission_queue.init_app(app, publish=publish_changes)
+
+
 # ============================================================================
 # PUBLIC ROUTES
 # ============================================================================
@@ -43,70 +130,297 @@ def admin_page():
 # ============================================================================
 
 @app.route('/api/leaderboard', methods=['GET'])
+@replica_reads
+@response_cache.cached
 def get_leaderboard():
-    """Get current player rankings (overall or regional-filtered)"""
+    """Get current player rankings (overall or regional-filtered)
+
+    Supports `limit`/`offset` paging and keyset paging via `after_id`
+    (plus optional `after_rating`, the exact mu of that row). `as_of`
+    (ISO timestamp) returns the standings after the games played by then.
+    """
     region_id = request.args.get('region_id', type=int)
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    after_rating = request.args.get('after_rating', type=float)
+    after_id = request.args.get('after_id', type=int)
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({'error': 'limit and offset must not be negative'}), 400
     
-    query = Player.query
-    if region_id:
-        query = query.filter_by(region_id=region_id)
-    
-    players = query.all()
-    # Sort by mu (since sigma is similar for starters, mu handles it)
-    sorted_players = sorted(players, key=lambda p: p.rating, reverse=True)
+    if 'as_of' in request.args:
+        try:
+            as_of = parse_timestamp(request.args['as_of'])
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            return jsonify({'error': 'Invalid as_of timestamp'}), 400
+        leaderboard = leaderboard_as_of(as_of, region_id, limit=limit, offset=offset, after_id=after_id)
+        return Response(encode(leaderboard), mimetype='application/json')
     
-    leaderboard = []
-    for rank, player in enumerate(sorted_players, 1):
-        player_data = player.to_dict()
-        player_data['rank'] = rank
-        leaderboard.append(player_data)
+    if app.config['LEADERBOARD_SNAPSHOT']:
+        body = synced_snapshot().page_json(region_id, limit=limit, offset=offset,
+                                           after_rating=after_rating, after_id=after_id)
+        return Response(body, mimetype='application/json')
     
-    return jsonify(leaderboard)
+    leaderboard = get_leaderboard_rows(region_id, limit=limit, offset=offset,
+                                       after_rating=after_rating, after_id=after_id)
+    return Response(encode(leaderboard), mimetype='application/json')
+
+
+@app.route('/api/players/<int:player_id>/rank', methods=['GET'])
+@replica_reads
+@response_cache.cached
+def get_player_rank_route(player_id):
+    region_id = request.args.get('region_id', type=int)
+    if app.config['LEADERBOARD_SNAPSHOT']:
+        rank = synced_snapshot().rank(player_id, region_id)
+    else:
+        player = Player.query.get_or_404(player_id)
+        rank = get_player_rank(player, region_id) if not region_id or player.region_id == region_id else None
+    if rank is None:
+        return jsonify({'error': 'Player not found on this leaderboard'}), 404
+    return jsonify({
+        'player_id': player_id,
+        'region_id': region_id,
+        'rank': rank
+    })
 
 
 @app.route('/api/regions', methods=['GET'])
+@replica_reads
+@response_cache.cached
 def get_regions():
     regions = Region.query.all()
     return jsonify([r.to_dict() for r in regions])
 
 
+@app.route('/api/regions/<int:region_id>/stats', methods=['GET'])
+@replica_reads
+@response_cache.cached
+def get_region_stats(region_id):
+    """Games, average points and active players per `period` plus the rating histogram
+
+    Returns the latest `periods` days or weeks, optionally within `since`/`until`.
+    """
+    region = db.session.get(Region, region_id)
+    if not region:
+        return jsonify({'error': 'Region not found'}), 404
+    period = request.args.get('period', 'week')
+    if period not in STATS_PERIODS:
+        return jsonify({'error': 'period must be day or week'}), 400
+    try:
+        since = parse_timestamp(request.args.get('since'))
+        until = parse_timestamp(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until timestamp'}), 400
+    periods = max(1, min(request.args.get('periods', 12, type=int), app.config['REGION_STATS_MAX_PERIODS']))
+    return jsonify({
+        'region_name': region.name,
+        **region_stats(region_id, period, periods, since, until)
+    })
+
+
 @app.route('/api/players', methods=['GET'])
+@replica_reads
+@response_cache.cached
 def get_players():
-    players = Player.query.all()
-    return jsonify([p.to_dict() for p in players])
+    if app.config['LEADERBOARD_SNAPSHOT']:
+        return Response(synced_snapshot().players_json(), mimetype='application/json')
+    players = db.session.execute(select_players().order_by(Player.id))
+    return Response(encode([player_row(row) for row in players]), mimetype='application/json')
 
 
 @app.route('/api/players/<int:player_id>', methods=['GET'])
+@replica_reads
+@response_cache.cached
 def get_player(player_id):
-    player = Player.query.get_or_404(player_id)
-    player_data = player.to_dict()
+    row = db.session.execute(select_players().where(Player.id == player_id)).first()
+    if row is None:
+        abort(404)
+    player_data = player_row(row)
     
     # Add recent games
-    recent_participations = GameParticipant.query.filter_by(player_id=player_id)\
-        .order_by(GameParticipant.id.desc())\
-        .limit(15)\
-        .all()
+    recent_participations = db.session.execute(
+        select(GameParticipant.game_id, Game.played_at, GameParticipant.placement, GameParticipant.points,
+               GameParticipant.mu_before, GameParticipant.mu_after, Game.num_players)
+        .join(Game, Game.id == GameParticipant.game_id)
+        .where(GameParticipant.player_id == player_id)
+        .order_by(GameParticipant.id.desc())
+        .limit(15)
+    )
     
     player_data['recent_games'] = []
-    for participation in recent_participations:
+    for game_id, played_at, placement, points, mu_before, mu_after, num_players in recent_participations:
         game_data = {
-            'game_id': participation.game_id,
-            'played_at': participation.game.played_at.isoformat(),
-            'placement': participation.placement,
-            'points': participation.points,
-            'rating_change': participation.rating_change,
-            'num_players': participation.game.num_players
+            'game_id': game_id,
+            'played_at': played_at.isoformat(),
+            'placement': placement,
+            'points': points,
+            'rating_change': int(round(mu_after)) - int(round(mu_before)),
+            'num_players': num_players
         }
         player_data['recent_games'].append(game_data)
     
-    return jsonify(player_data)
+    return Response(encode(player_data), mimetype='application/json')
+
+
+@app.route('/api/players/<int:player_id>/history', methods=['GET'])
+@response_cache.cached
+def get_player_history(player_id):
+    """Full mu/sigma trajectory of a player, oldest first
+
+    Supports `since`/`until` (ISO timestamps), `points` downsampling, and
+    `limit` with the returned `next_cursor` for pagination.
+    """
+    if not db.session.get(Player, player_id):
+        return jsonify({'error': 'Player not found'}), 404
+    try:
+        since = parse_timestamp(request.args.get('since'))
+        until = parse_timestamp(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until timestamp'}), 400
+    points = request.args.get('points', type=int)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    history = history_cache.get(player_id, response_cache.version())
+    start, stop = history.window(since, until)
+    
+    next_cursor = None
+    if points:
+        indices = downsample(start, stop, max(2, min(points, app.config['HISTORY_MAX_POINTS'])))
+    else:
+        if cursor:
+            try:
+                played_at, game_id = (int(part) for part in cursor.split('_'))
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            start = max(start, history.position_after(played_at, game_id))
+        if limit is not None and start + limit < stop:
+            stop = start + max(limit, 1)
+            next_cursor = history.cursor(stop - 1)
+        indices = range(start, stop)
+    
+    return jsonify({
+        'player_id': player_id,
+        'total': len(history),
+        'next_cursor': next_cursor,
+        **history.points(indices)
+    })
+
+
+@app.route('/api/players/<int:player_id>/rivals', methods=['GET'])
+@replica_reads
+@response_cache.cached
+def get_player_rivals(player_id):
+    """Head-to-head records against every opponent, most games (or `sort`) first"""
+    if not db.session.get(Player, player_id):
+        return jsonify({'error': 'Player not found'}), 404
+    sort = request.args.get('sort', 'games')
+    if sort not in RIVAL_SORTS:
+        return jsonify({'error': f"sort must be one of {', '.join(RIVAL_SORTS)}"}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    return jsonify({
+        'player_id': player_id,
+        'rivals': rivals(player_id, sort, limit)
+    })
+
+
+@app.route('/api/players/<int:player_id>/vs/<int:opponent_id>', methods=['GET'])
+@replica_reads
+@response_cache.cached
+def get_player_versus(player_id, opponent_id):
+    if not db.session.get(Player, player_id):
+        return jsonify({'error': 'Player not found'}), 404
+    opponent = db.session.get(Player, opponent_id)
+    if not opponent:
+        return jsonify({'error': 'Opponent not found'}), 404
+    return jsonify(versus(player_id, opponent_id, opponent.name))
 
 
 @app.route('/api/games', methods=['GET'])
+@replica_reads
+@response_cache.cached
 def get_games():
     limit = request.args.get('limit', 20, type=int)
-    games = Game.query.order_by(Game.played_at.desc()).limit(limit).all()
-    return jsonify([g.to_dict() for g in games])
+    if limit < 0:
+        return jsonify({'error': 'limit must not be negative'}), 400
+    keys = db.session.execute(select_game_keys().order_by(Game.played_at.desc()).limit(limit)).all()
+    with on_primary():
+        body = games_json(keys)
+    return Response(body, mimetype='application/json')
+
+
+@app.route('/api/stream/leaderboard', methods=['GET'])
+def stream_leaderboard():
+    """Server-Sent Events feed of rank changes (optionally for one `region_id`)"""
+    subscription = leaderboard_broadcaster.subscribe(request.args.get('region_id', type=int))
+    if subscription is None:
+        return jsonify({'error': 'Too many live clients, poll /api/leaderboard instead'}), 503
+    return Response(leaderboard_broadcaster.events(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/export/games', methods=['GET'])
+def export_game_history():
+    """Stream every game (after `since_id`) as NDJSON or `format=csv`"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    chunks = export_games(fmt, since_id=request.args.get('since_id', type=int))
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=games.{fmt}'})
+
+
+@app.route('/api/export/players', methods=['GET'])
+def export_player_ratings():
+    """Stream all players (optionally one `region_id`) as NDJSON or `format=csv`"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    chunks = export_players(fmt, region_id=request.args.get('region_id', type=int))
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=players.{fmt}'})
+
+
+@app.route('/api/predict', methods=['POST'])
+def predict_tables():
+    """Win/placement probabilities and draw (quality) score for candidate tables"""
+    data = request.get_json(silent=True) or {}
+    tables = data.get('tables') or []
+    if not tables or len(tables) > app.config['PREDICT_MAX_TABLES']:
+        return jsonify({'error': f"Provide 1-{app.config['PREDICT_MAX_TABLES']} tables"}), 400
+    for table in tables:
+        if not isinstance(table, list) or not 2 <= len(table) <= 4 \
+                or not all(isinstance(p, int) for p in table) or len(set(table)) != len(table):
+            return jsonify({'error': 'Each table must list 2-4 distinct player ids'}), 400
+    
+    player_ids = {player_id for table in tables for player_id in table}
+    ratings = {row.id: (row.mu, row.sigma) for row in db.session.execute(
+        select(Player.id, Player.mu, Player.sigma).where(Player.id.in_(player_ids))
+    )}
+    missing = player_ids - ratings.keys()
+    if missing:
+        return jsonify({'error': f'Player {min(missing)} not found'}), 404
+    
+    seats = [ratings[player_id] for table in tables for player_id in table]
+    prediction = rating_system.predict_many(
+        [mu for mu, _ in seats], [sigma for _, sigma in seats], [len(table) for table in tables]
+    )
+    
+    win = prediction['win'].tolist()
+    placement = prediction['placement'].tolist()
+    results, seat = [], 0
+    for table, draw in zip(tables, prediction['draw'].tolist()):
+        size = len(table)
+        results.append({
+            'players': table,
+            'win_probability': win[seat:seat + size],
+            'placement_probabilities': [row[:size] for row in placement[seat:seat + size]],
+            'draw_probability': draw
+        })
+        seat += size
+    return jsonify({'tables': results})
 
 
 # ============================================================================
@@ -144,6 +458,7 @@ def add_region():
     region = Region(name=name)
     db.session.add(region)
     db.session.commit()
+    publish_changes()
     return jsonify({'success': True, 'region': region.to_dict()}), 201
 
 
@@ -168,7 +483,9 @@ def add_player():
     player = Player(name=name, region_id=region_id, mu=init.mu, sigma=init.sigma)
     
     db.session.add(player)
+    update_histogram(db.session, (), rating_buckets([(region.id, player.mu)]))
     db.session.commit()
+    publish_changes(updated=[player])
     return jsonify({'success': True, 'player': player.to_dict()}), 201
 
 
@@ -178,66 +495,273 @@ def delete_player(player_id):
     player = Player.query.get_or_404(player_id)
     if player.games_played > 0:
         return jsonify({'error': 'Cannot delete player with history'}), 400
+    update_histogram(db.session, rating_buckets([(player.region_id, player.mu)]), ())
     db.session.delete(player)
     db.session.commit()
+    publish_changes(removed=[player_id])
     return jsonify({'success': True})
 
 
 @app.route('/api/admin/games', methods=['POST'])
 @admin_required
 def submit_game():
-    data = request.get_json()
+    """Queue a game for the rating writer and return its ticket
+
+    `wait` (seconds) blocks until the game is applied and answers with it
+    like a synchronous submission; otherwise the ticket comes back with 202.
+    An `Idempotency-Key` header (or `idempotency_key`) makes retries safe.
+    """
+    data = request.get_json(silent=True) or {}
     results = data.get('results', [])
     
-    if not results or len(results) < 2 or len(results) > 4:
-        return jsonify({'error': 'Game must have 2-4 players'}), 400
-
-    player_data_list = []
-    for r in results:
-        player = Player.query.get(r['player_id'])
-        if not player:
-            return jsonify({'error': f"Player {r['player_id']} not found"}), 404
-        player_data_list.append({
-            'player': player,
-            'placement': r['placement'],
-            'points': r['points']
-        })
+    try:
+        game = normalize_game({'results': results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not all(isinstance(r['ref'], int) for r in game['results']):
+        return jsonify({'error': 'Each result needs a player_id'}), 400
+    
+    player_ids = [r['ref'] for r in game['results']]
+    found = set(db.session.scalars(select(Player.id).where(Player.id.in_(player_ids))))
+    for player_id in player_ids:
+        if player_id not in found:
+            return jsonify({'error': f"Player {player_id} not found"}), 404
+    
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key is not None and not (isinstance(key, str) and 0 < len(key) <= 100):
+        return jsonify({'error': 'idempotency_key must be a string of at most 100 characters'}), 400
+    submission, created = submission_queue.enqueue(
+        [{'player_id': r['ref'], 'placement': r['placement'], 'points': r['points']} for r in game['results']],
+        idempotency_key=key
+    )
+    
+    try:
+        wait = min(float(data.get('wait', request.args.get('wait', 0))), app.config['SUBMISSION_MAX_WAIT'])
+    except (TypeError, ValueError):
+        wait = 0
+    if wait > 0:
+        submission = submission_queue.wait(submission.id, wait)
+    return submission_response(submission, 201 if created else 200)
+
+
+def submission_response(submission, applied_status=200):
+    """JSON body and status code describing a submission's progress"""
+    body = {'success': submission.status != 'failed', **submission.to_dict()}
+    if submission.status == 'queued':
+        return jsonify(body), 202
+    if submission.status == 'failed':
+        return jsonify({**body, 'error': submission.error}), 422
+    game = db.session.get(Game, submission.game_id)
+    if game is not None:
+        body['game'] = game.to_dict()
+    return jsonify(body), applied_status
+
+
+@app.route('/api/admin/games/status/<int:ticket>', methods=['GET'])
+@admin_required
+def submission_status(ticket):
+    """Report whether a queued game has been applied"""
+    submission = submission_queue.status(ticket)
+    if submission is None:
+        return jsonify({'error': 'Ticket not found'}), 404
+    return submission_response(submission)
+
+
+@app.route('/api/admin/games/bulk', methods=['POST'])
+@admin_required
+@rating_writes
+def bulk_import_games():
+    """Import many games from a JSON Lines or CSV body (or `file` upload)"""
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if not fmt:
+        content_type = upload.mimetype if upload else request.mimetype
+        filename = upload.filename if upload else ''
+        fmt = 'csv' if content_type == 'text/csv' or filename.endswith('.csv') else 'jsonl'
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    raw = upload.stream if upload else request.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    summary = import_games(
+        parse_stream(stream, fmt),
+        chunk_size=request.args.get('chunk_size', type=int),
+        strict=request.args.get('strict', '0') == '1'
+    )
+    if summary['imported']:
+        publish_changes(rebuild=True)
+    
+    status = 400 if summary['failed'] and not summary['imported'] else 200
+    return jsonify({'success': summary['imported'] > 0 or not summary['failed'], **summary}), status
+
+
+@app.route('/api/admin/games/<int:game_id>', methods=['PUT'])
+@admin_required
+@rating_writes
+def edit_game(game_id):
+    """Correct a game's results and replay only the history it affects"""
+    Game.query.get_or_404(game_id)
+    data = request.get_json()
+    try:
+        game = normalize_game(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    results = []
+    for r in game['results']:
+        if not isinstance(r['ref'], int) or not db.session.get(Player, r['ref']):
+            return jsonify({'error': f"Player {r['ref']} not found"}), 404
+        results.append({'player_id': r['ref'], 'placement': r['placement'], 'points': r['points']})
+    
+    summary = rewrite_game(game_id, results=results, played_at=game['played_at'])
+    publish_changes(updated=Player.query.options(joinedload(Player.region))
+                    .filter(Player.id.in_(summary['affected_players'])).all(), games=summary['affected_games'])
+    return jsonify({'success': True, 'game': db.session.get(Game, game_id).to_dict(), **summary})
+
+
+@app.route('/api/admin/games/<int:game_id>', methods=['DELETE'])
+@admin_required
+@rating_writes
+def delete_game(game_id):
+    """Delete a game and replay only the history it affects"""
+    Game.query.get_or_404(game_id)
+    summary = rewrite_game(game_id)
+    publish_changes(updated=Player.query.options(joinedload(Player.region))
+                    .filter(Player.id.in_(summary['affected_players'])).all(), games=summary['affected_games'])
+    return jsonify({'success': True, **summary})
+
 
-    # Calculate ratings
-    processed = rating_system.process_game_results(player_data_list)
-    
-    # Create game
-    game = Game(num_players=len(results))
-    db.session.add(game)
-    db.session.flush()
-
-    for res in processed:
-        player = res['player']
-        
-        participant = GameParticipant(
-            game_id=game.id,
-            player_id=player.id,
-            placement=res['placement'],
-            points=res['points'],
-            mu_before=res['mu_before'],
-            sigma_before=res['sigma_before'],
-            mu_after=res['mu_after'],
-            sigma_after=res['sigma_after']
+@app.route('/api/admin/rounds/assign', methods=['POST'])
+@admin_required
+def assign_round_tables():
+    """Split checked-in players into 3-4 player tables for a tournament round"""
+    data = request.get_json(silent=True) or {}
+    player_ids = data.get('player_ids') or []
+    if not player_ids or not all(isinstance(p, int) for p in player_ids) or len(set(player_ids)) != len(player_ids):
+        return jsonify({'error': 'player_ids must be a list of distinct player ids'}), 400
+    try:
+        since = parse_timestamp(data.get('since'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since timestamp'}), 400
+    time_budget_ms = data.get('time_budget_ms', app.config['MATCHMAKING_TIME_BUDGET_MS'])
+    repeat_penalty = data.get('repeat_penalty', app.config['MATCHMAKING_REPEAT_PENALTY'])
+    if not is_number(time_budget_ms) or not is_number(repeat_penalty) or time_budget_ms < 0 or repeat_penalty < 0:
+        return jsonify({'error': 'time_budget_ms and repeat_penalty must be non-negative numbers'}), 400
+    seed = data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        return jsonify({'error': 'seed must be an integer'}), 400
+    
+    try:
+        summary = assign_round(
+            player_ids,
+            by_region=bool(data.get('by_region', False)),
+            since=since,
+            time_budget_ms=min(time_budget_ms, app.config['MATCHMAKING_MAX_TIME_BUDGET_MS']),
+            repeat_penalty=repeat_penalty,
+            seed=seed
         )
-        db.session.add(participant)
-        
-        # Update player
-        player.mu = res['mu_after']
-        player.sigma = res['sigma_after']
-        player.games_played += 1
-        player.total_points += res['points']
-        if res['placement'] == 1: player.first_place += 1
-        elif res['placement'] == 2: player.second_place += 1
-        elif res['placement'] == 3: player.third_place += 1
-        elif res['placement'] == 4: player.fourth_place += 1
-        
-    db.session.commit()
-    return jsonify({'success': True, 'game': game.to_dict()}), 201
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, **summary})
+
+
+@app.route('/api/admin/replay', methods=['POST'])
+@admin_required
+@rating_writes
+def replay_ratings():
+    """Recompute all ratings from game history (`dry_run` reports the diff only)"""
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run', False))
+    try:
+        batch_size = int(data.get('batch_size', app.config['REPLAY_BATCH_SIZE']))
+        workers = int(data.get('workers', app.config['REPLAY_WORKERS']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'batch_size and workers must be integers'}), 400
+    if not 1 <= batch_size <= app.config['REPLAY_MAX_BATCH_SIZE']:
+        return jsonify({'error': f"batch_size must be 1-{app.config['REPLAY_MAX_BATCH_SIZE']}"}), 400
+    if workers < 1:
+        return jsonify({'error': 'workers must be at least 1'}), 400
+    
+    try:
+        summary = recompute_ratings(
+            workers=min(workers, app.config['REPLAY_MAX_WORKERS']),
+            dry_run=dry_run,
+            batch_size=batch_size,
+            progress=lambda done, total: app.logger.info('Replay: %d/%d games', done, total)
+        )
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    if not dry_run and (summary['participants_changed'] or summary['players_changed']):
+        publish_changes(rebuild=True)
+    return jsonify({'success': True, **summary})
+
+
+@app.route('/api/admin/simulate', methods=['POST'])
+@admin_required
+def simulate_season():
+    """Monte Carlo forecast of title and top-k odds over the next rounds"""
+    data = request.get_json(silent=True) or {}
+    player_ids = data.get('player_ids') or None
+    if player_ids is not None and not all(isinstance(p, int) for p in player_ids):
+        return jsonify({'error': 'player_ids must be a list of player ids'}), 400
+    scenario = data.get('scenario', 'swiss')
+    if scenario not in SCENARIOS:
+        return jsonify({'error': f'scenario must be one of {sorted(SCENARIOS)}'}), 400
+    
+    try:
+        rounds = int(data.get('rounds', 6))
+        seasons = int(data.get('seasons', app.config['SIMULATION_SEASONS']))
+        top = int(data.get('top', 3))
+        new_players = int(data.get('new_players', 0))
+        workers = int(data.get('workers', app.config['SIMULATION_WORKERS']))
+        games_per_round = int(data.get('games_per_round') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'rounds, seasons, top, new_players, workers and games_per_round must be integers'}), 400
+    if rounds < 1 or top < 1 or new_players < 0 or not 1 <= seasons <= app.config['SIMULATION_MAX_SEASONS']:
+        return jsonify({'error': f"seasons must be 1-{app.config['SIMULATION_MAX_SEASONS']}; rounds and top at least 1"}), 400
+    if workers < 1 or games_per_round < 0:
+        return jsonify({'error': 'workers must be at least 1 and games_per_round not negative'}), 400
+    seed, region_id = data.get('seed'), data.get('region_id')
+    if any(value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0)
+           for value in (seed, region_id)):
+        return jsonify({'error': 'seed and region_id must be non-negative integers'}), 400
+    sigma_threshold = data.get('sigma_threshold')
+    if sigma_threshold is not None and not (is_number(sigma_threshold) and sigma_threshold > 0):
+        return jsonify({'error': 'sigma_threshold must be a positive number'}), 400
+    
+    options = {}
+    if scenario == 'random' and games_per_round:
+        options['games_per_round'] = games_per_round
+    try:
+        summary = simulate(
+            player_ids=player_ids,
+            region_id=region_id,
+            rounds=rounds,
+            seasons=seasons,
+            scenario=scenario,
+            scenario_options=options,
+            top=top,
+            new_players=new_players,
+            sigma_threshold=sigma_threshold,
+            workers=min(workers, app.config['SIMULATION_MAX_WORKERS']),
+            seed=seed
+        )
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, **summary})
+
+
+@app.route('/api/admin/metrics', methods=['GET'])
+@admin_required
+def metrics():
+    """Per-endpoint latency histograms and query totals in Prometheus text format"""
+    if not instrumentation.enabled:
+        return jsonify({'error': 'Set INSTRUMENTATION_ENABLED=1 to collect metrics'}), 404
+    return Response(instrumentation.prometheus(), mimetype='text/plain; version=0.0.4')
 
 
 # ============================================================================
@@ -0,0 +1,247 @@
+"""
+Load test /api/leaderboard and /api/admin/games under concurrent clients.
+
+Serves the app from a threaded WSGI server on a synthetic database and
+drives it with N client threads for a fixed time per scenario (reads
+only, writes only, then 90/10 mixed), reporting p50/p99 latency and
+throughput per endpoint. The response cache and leaderboard snapshot are
+off by default so every read reaches the database.
+
+With --compare the workload runs twice, each time in a fresh process on an
+identical copy of the database: once with SQLAlchemy's default engine
+settings (DB_ENGINE_TUNING=0) and once with the tuned pool and PRAGMAs.
+
+Usage:
+    python benchmarks/bench_load.py [--clients 16] [--seconds 10] [--players 2000] [--games 20000]
+                                    [--compare] [--database-url URL] [--json results.json]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = {
+    'read': 1.0,
+    'write': 0.0,
+    'mixed': 0.9,
+}
+
+
+def seed_database(num_players, num_games, seed):
+    """Create regions, players and rated games through the bulk import path"""
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Region, Player
+    from bulk_import import import_games
+    from rating_system import rating_system
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Player.id).first() is not None:
+            return
+        regions = [Region(name=f'Region {i + 1}') for i in range(5)]
+        db.session.add_all(regions)
+        db.session.flush()
+        initial = rating_system.create_initial_rating()
+        db.session.execute(insert(Player), [
+            {'name': f'Player {i + 1}', 'region_id': rng.choice(regions).id, 'mu': initial.mu, 'sigma': initial.sigma,
+             'games_played': 0, 'first_place': 0, 'second_place': 0, 'third_place': 0, 'fourth_place': 0,
+             'total_points': 0}
+            for i in range(num_players)
+        ])
+        db.session.commit()
+
+        start = datetime.utcnow() - timedelta(days=365)
+        records = []
+        for i in range(num_games):
+            size = rng.choice((2, 3, 4))
+            records.append((i + 1, {
+                'played_at': (start + timedelta(minutes=10 * i)).isoformat(),
+                'results': [{'player_id': player_id, 'placement': place, 'points': 16 - 3 * place}
+                            for place, player_id in enumerate(rng.sample(range(1, num_players + 1), size), 1)]
+            }))
+        import_games(records)
+
+
+def request(port, method, path, body=None, cookie=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/json'}
+    if cookie:
+        headers['Cookie'] = cookie
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status, response.getheader('Set-Cookie')
+    finally:
+        conn.close()
+
+
+def run_scenario(port, cookie, read_share, clients, seconds, num_players, seed):
+    """Drive the server from `clients` threads; returns latency lists (ms) and error counts per endpoint"""
+    latencies = {'leaderboard': [], 'submit': []}
+    errors = {'leaderboard': 0, 'submit': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            if rng.random() < read_share:
+                endpoint = 'leaderboard'
+                args = ('GET', f'/api/leaderboard?limit=100&offset={rng.randrange(max(num_players - 100, 1))}')
+            else:
+                endpoint = 'submit'
+                players = rng.sample(range(1, num_players + 1), 4)
+                args = ('POST', '/api/admin/games', {
+                    'results': [{'player_id': p, 'placement': i + 1, 'points': 15 - 2 * i} for i, p in enumerate(players)],
+                    'wait': 30
+                }, cookie)
+            started = time.perf_counter()
+            try:
+                status, _ = request(port, *args)
+            except OSError:
+                status = None
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if status in (200, 201):
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def summarize(latencies, errors, seconds):
+    summary = {}
+    for endpoint, values in latencies.items():
+        if not values and not errors[endpoint]:
+            continue
+        summary[endpoint] = {
+            'requests': len(values),
+            'errors': errors[endpoint],
+            'rps': round(len(values) / seconds, 1),
+            'p50_ms': round(float(np.percentile(values, 50)), 2) if values else None,
+            'p99_ms': round(float(np.percentile(values, 99)), 2) if values else None,
+        }
+    return summary
+
+
+def run_benchmark(args):
+    """Serve the app in this process and run every scenario against it"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    _, cookie = request(port, 'POST', '/api/admin/login',
+                        {'username': app.config['ADMIN_USERNAME'], 'password': app.config['ADMIN_PASSWORD']})
+    cookie = cookie.split(';', 1)[0]
+
+    results = {}
+    for name, read_share in SCENARIOS.items():
+        latencies, errors = run_scenario(port, cookie, read_share, args.clients, args.seconds, args.players, args.seed)
+        results[name] = summarize(latencies, errors, args.seconds)
+    server.shutdown()
+    return {
+        'engine_tuning': app.config['DB_ENGINE_TUNING'],
+        'engine_options': app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+        'sqlite_pragmas': app.config['SQLITE_PRAGMAS'],
+        'clients': args.clients,
+        'seconds': args.seconds,
+        'scenarios': results
+    }
+
+
+def print_results(label, result):
+    print(f"\n{label} (engine tuning {'on' if result['engine_tuning'] else 'off'}, {result['clients']} clients)")
+    print(f"{'scenario':<10}{'endpoint':<14}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for scenario, endpoints in result['scenarios'].items():
+        for endpoint, stats in endpoints.items():
+            print(f"{scenario:<10}{endpoint:<14}{stats['rps']:>9}{stats['p50_ms'] or '-':>10}"
+                  f"{stats['p99_ms'] or '-':>10}{stats['errors']:>8}")
+
+
+def child(args, mode, database_url, tuning='1'):
+    """Run one step in a fresh interpreter, since Config is read at import"""
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ENGINE_TUNING=tuning)
+    command = [sys.executable, os.path.abspath(__file__), mode,
+               '--clients', str(args.clients), '--seconds', str(args.seconds),
+               '--players', str(args.players), '--games', str(args.games), '--seed', str(args.seed)]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1]) if mode == '--run' else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', help='benchmark an existing database instead of a temporary SQLite file')
+    parser.add_argument('--compare', action='store_true', help='run with default and tuned engine settings')
+    parser.add_argument('--with-caches', action='store_true', help='keep the response cache and snapshot on')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.with_caches:
+        os.environ.setdefault('RESPONSE_CACHE_ENABLED', '0')
+        os.environ.setdefault('LEADERBOARD_SNAPSHOT', '0')
+
+    if args.seed_only or args.run:
+        seed_database(args.players, args.games, args.seed)
+        if args.run:
+            print(json.dumps(run_benchmark(args)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    try:
+        seed_url = args.database_url or f'sqlite:///{os.path.join(workdir, "seed.db")}'
+        child(args, '--seed-only', seed_url)
+
+        runs = [('tuned', '1')] if not args.compare else [('default', '0'), ('tuned', '1')]
+        results = {}
+        for label, tuning in runs:
+            database_url = seed_url
+            if not args.database_url:
+                # Each configuration starts from an identical copy of the seeded file
+                path = os.path.join(workdir, f'{label}.db')
+                shutil.copyfile(os.path.join(workdir, 'seed.db'), path)
+                database_url = f'sqlite:///{path}'
+            results[label] = child(args, '--run', database_url, tuning)
+            print_results(label, results[label])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark RatingSystem.rate_many against the per-game openskill loop.
+
+Usage:
+    python benchmarks/bench_rating.py [--games 20000] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rating_system import rating_system  # noqa: E402
+
+
+def random_games(num_games, rng):
+    """Flat mu/sigma/rank arrays for `num_games` independent 2-4 player games"""
+    game_sizes = rng.integers(2, 5, size=num_games)
+    total = int(game_sizes.sum())
+    mu = rng.normal(1000.0, 200.0, size=total)
+    sigma = rng.uniform(40.0, 1000.0 / 3.0, size=total)
+    ranks = np.concatenate([rng.integers(1, size + 1, size=size) for size in game_sizes])
+    return mu, sigma, ranks, game_sizes
+
+
+def per_game_loop(mu, sigma, ranks, game_sizes):
+    results = []
+    start = 0
+    for size in game_sizes:
+        stop = start + size
+        results.extend(rating_system.calculate_new_ratings(
+            list(zip(mu[start:stop].tolist(), sigma[start:stop].tolist())),
+            ranks[start:stop].tolist()
+        ))
+        start = stop
+    return np.array(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mu, sigma, ranks, game_sizes = random_games(args.games, np.random.default_rng(args.seed))
+
+    started = time.perf_counter()
+    expected = per_game_loop(mu, sigma, ranks, game_sizes)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_mu, new_sigma = rating_system.rate_many(mu, sigma, ranks, game_sizes)
+    batch_seconds = time.perf_counter() - started
+
+    error = max(np.abs(new_mu - expected[:, 0]).max(), np.abs(new_sigma - expected[:, 1]).max())
+    print(f'games:            {args.games}')
+    print(f'per-game loop:    {loop_seconds:.3f}s ({args.games / loop_seconds:,.0f} games/s)')
+    print(f'rate_many:        {batch_seconds:.3f}s ({args.games / batch_seconds:,.0f} games/s)')
+    print(f'speedup:          {loop_seconds / batch_seconds:.1f}x')
+    print(f'max abs error:    {error:.2e}')
+    if error > 1e-9:
+        sys.exit('rate_many diverged from openskill')
+
+
+if __name__ == '__main__':
+    main()
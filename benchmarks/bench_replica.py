@@ -0,0 +1,211 @@
+"""
+Read-heavy load with and without a read replica.
+
+Serves the app from a threaded WSGI server and drives the public GET
+endpoints (leaderboard, players, player detail, games, regions) from N
+client threads while one admin client keeps submitting games, then
+reports requests per second and p50/p99 latency per endpoint. The
+workload runs twice in fresh processes on identical copies of a
+synthetic database: once with every query on the primary and once with
+DATABASE_REPLICA_URL pointing at a second SQLite file (or --replica-url).
+
+The SQLite stand-in is a copy taken before the run and does not receive
+the new games, so it measures contention, not replication lag. The
+response cache and leaderboard snapshot are off by default so every read
+reaches the database.
+
+Usage:
+    python benchmarks/bench_replica.py [--clients 32] [--seconds 10] [--players 2000] [--games 20000]
+                                       [--database-url URL --replica-url URL] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_load import ROOT, seed_database, request, summarize  # noqa: E402
+
+READS = {
+    'leaderboard': 0.4,
+    'player': 0.3,
+    'games': 0.15,
+    'players': 0.05,
+    'regions': 0.1,
+}
+
+
+def read_path(endpoint, rng, num_players):
+    if endpoint == 'leaderboard':
+        return f'/api/leaderboard?limit=50&offset={rng.randrange(max(num_players - 50, 1))}'
+    if endpoint == 'player':
+        return f'/api/players/{rng.randint(1, num_players)}'
+    if endpoint == 'games':
+        return '/api/games?limit=20'
+    return f'/api/{endpoint}'
+
+
+def run_workload(port, cookie, clients, seconds, num_players, seed):
+    """Reader threads plus one submitting admin; returns latency lists (ms) and error counts per endpoint"""
+    latencies = {endpoint: [] for endpoint in (*READS, 'submit')}
+    errors = dict.fromkeys(latencies, 0)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def timed(endpoint, *args):
+        started = time.perf_counter()
+        try:
+            status, _ = request(port, *args)
+        except OSError:
+            status = None
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            if status in (200, 201):
+                latencies[endpoint].append(elapsed)
+            else:
+                errors[endpoint] += 1
+
+    def reader(index):
+        rng = random.Random(seed * 1000 + index)
+        endpoints, weights = list(READS), list(READS.values())
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            timed(endpoint, 'GET', read_path(endpoint, rng, num_players))
+
+    def writer():
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            players = rng.sample(range(1, num_players + 1), 4)
+            timed('submit', 'POST', '/api/admin/games', {
+                'results': [{'player_id': p, 'placement': i + 1, 'points': 15 - 2 * i} for i, p in enumerate(players)],
+                'wait': 30
+            }, cookie)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(clients)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def run_benchmark(args):
+    """Serve the app in this process and run the workload against it"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    _, cookie = request(port, 'POST', '/api/admin/login',
+                        {'username': app.config['ADMIN_USERNAME'], 'password': app.config['ADMIN_PASSWORD']})
+    latencies, errors = run_workload(port, cookie.split(';', 1)[0], args.clients, args.seconds, args.players, args.seed)
+    server.shutdown()
+    endpoints = summarize(latencies, errors, args.seconds)
+    return {
+        'replica': bool(app.config['DATABASE_REPLICA_URL']),
+        'clients': args.clients,
+        'seconds': args.seconds,
+        'read_rps': round(sum(stats['rps'] for name, stats in endpoints.items() if name != 'submit'), 1),
+        'endpoints': endpoints
+    }
+
+
+def print_results(label, result):
+    print(f"\n{label}: {result['read_rps']} reads/s from {result['clients']} clients")
+    print(f"{'endpoint':<14}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for endpoint, stats in result['endpoints'].items():
+        print(f"{endpoint:<14}{stats['rps']:>9}{stats['p50_ms'] or '-':>10}{stats['p99_ms'] or '-':>10}{stats['errors']:>8}")
+
+
+def child(args, mode, database_url, replica_url=None):
+    """Run one step in a fresh interpreter, since Config is read at import"""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env.pop('DATABASE_REPLICA_URL', None)
+    if replica_url:
+        env['DATABASE_REPLICA_URL'] = replica_url
+    command = [sys.executable, os.path.abspath(__file__), mode,
+               '--clients', str(args.clients), '--seconds', str(args.seconds),
+               '--players', str(args.players), '--games', str(args.games), '--seed', str(args.seed)]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1]) if mode == '--run' else None
+
+
+def copy_sqlite(source, target):
+    """Copy a SQLite database including anything still in its WAL"""
+    import sqlite3
+
+    conn = sqlite3.connect(source)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    shutil.copyfile(source, target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', help='primary to benchmark instead of a temporary SQLite file')
+    parser.add_argument('--replica-url', help='replica of --database-url (default: a copy of the SQLite primary)')
+    parser.add_argument('--with-caches', action='store_true', help='keep the response cache and snapshot on')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--seed-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.with_caches:
+        os.environ.setdefault('RESPONSE_CACHE_ENABLED', '0')
+        os.environ.setdefault('LEADERBOARD_SNAPSHOT', '0')
+
+    if args.seed_only or args.run:
+        seed_database(args.players, args.games, args.seed)
+        if args.run:
+            print(json.dumps(run_benchmark(args)))
+        return
+    if args.database_url and not args.replica_url:
+        parser.error('--database-url needs --replica-url')
+
+    workdir = tempfile.mkdtemp(prefix='bench_replica_')
+    try:
+        seed_url = args.database_url or f'sqlite:///{os.path.join(workdir, "seed.db")}'
+        child(args, '--seed-only', seed_url)
+
+        results = {}
+        for label in ('primary only', 'with replica'):
+            database_url, replica_url = seed_url, args.replica_url
+            if not args.database_url:
+                # Each run starts from identical copies of the seeded file
+                primary = os.path.join(workdir, 'primary.db')
+                copy_sqlite(os.path.join(workdir, 'seed.db'), primary)
+                database_url = f'sqlite:///{primary}'
+                replica = os.path.join(workdir, 'replica.db')
+                copy_sqlite(os.path.join(workdir, 'seed.db'), replica)
+                replica_url = f'sqlite:///{replica}'
+            results[label] = child(args, '--run', database_url, replica_url if label == 'with replica' else None)
+            print_results(label, results[label])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
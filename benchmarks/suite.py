@@ -0,0 +1,233 @@
+"""
+Repeatable benchmark suite with machine-readable results.
+
+Generates (or reuses) a synthetic database, then times the main paths
+through the Flask test client: leaderboard reads (snapshot and SQL),
+player detail, game submission, full replay and streaming export. The
+response cache is off so every request does its real work. Results and
+run metadata go to a JSON file. With --baseline, each metric is compared
+with an earlier results file and the run exits non-zero if anything
+regressed by more than --threshold.
+
+Usage:
+    python benchmarks/suite.py [--database-url URL] [--players 100000] [--games 1000000]
+                               [--only leaderboard,submit] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARKS = ('leaderboard', 'leaderboard_sql', 'player_detail', 'submit', 'replay', 'export')
+
+
+def latency_stats(samples):
+    """Summary of per-request latencies in seconds"""
+    ms = np.array(samples) * 1000
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'requests_per_s': round(len(samples) / (ms.sum() / 1000), 1)
+    }
+
+
+def time_requests(client, paths, method='get', **kwargs):
+    samples = []
+    for path in paths:
+        started = time.perf_counter()
+        response = getattr(client, method)(path, **kwargs)
+        response.get_data()
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+    return latency_stats(samples)
+
+
+def bench_leaderboard(app, client, rng, args, use_snapshot=True):
+    app.config['LEADERBOARD_SNAPSHOT'] = use_snapshot
+    client.get('/api/leaderboard?limit=1')  # Build the snapshot outside the timed loop
+    paths = [f'/api/leaderboard?limit=100&offset={rng.randrange(max(args.players - 100, 1))}'
+             for _ in range(args.iterations)]
+    stats = time_requests(client, paths)
+    regional = [f'/api/leaderboard?region_id={rng.randrange(1, args.regions + 1)}&limit=100'
+                for _ in range(args.iterations)]
+    stats['region'] = time_requests(client, regional)
+    app.config['LEADERBOARD_SNAPSHOT'] = True
+    return stats
+
+
+def bench_player_detail(app, client, rng, args):
+    return time_requests(client, [f'/api/players/{rng.randrange(1, args.players + 1)}' for _ in range(args.iterations)])
+
+
+def bench_submit(app, client, rng, args):
+    samples = []
+    for _ in range(args.iterations):
+        players = rng.sample(range(1, args.players + 1), 4)
+        body = {'results': [{'player_id': p, 'placement': i + 1, 'points': 15 - 2 * i} for i, p in enumerate(players)],
+                'wait': 30}
+        started = time.perf_counter()
+        response = client.post('/api/admin/games', json=body)
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 201:
+            raise RuntimeError(f'Game submission returned {response.status_code}')
+    return latency_stats(samples)
+
+
+def bench_replay(app, client, rng, args):
+    from replay import recompute_ratings
+
+    with app.app_context():
+        started = time.perf_counter()
+        summary = recompute_ratings(dry_run=True)
+        seconds = time.perf_counter() - started
+    return {'games': summary['games'], 'seconds': round(seconds, 3), 'games_per_s': round(summary['games'] / seconds, 1)}
+
+
+def bench_export(app, client, rng, args):
+    started = time.perf_counter()
+    response = client.get('/api/export/games', buffered=False)
+    first_chunk = None
+    size = lines = 0
+    for chunk in response.response:
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b'\n' if isinstance(chunk, bytes) else '\n')
+    response.close()
+    seconds = time.perf_counter() - started
+    return {'games': lines, 'megabytes': round(size / 1e6, 2), 'seconds': round(seconds, 3),
+            'first_chunk_ms': round(first_chunk * 1000, 3), 'games_per_s': round(lines / seconds, 1)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=''):
+    """{'a': {'p50_ms': 1}} -> {'a.p50_ms': 1}"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(results, baseline, threshold):
+    """Print metric changes against a baseline; returns the regressed metric names"""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    for name in sorted(current.keys() & previous.keys()):
+        # Latencies should go down, throughputs up; other numbers are informational
+        if name.endswith('_ms') or name.endswith('.seconds'):
+            change = (current[name] - previous[name]) / previous[name] if previous[name] else 0.0
+        elif name.endswith('_per_s'):
+            change = (previous[name] - current[name]) / previous[name] if previous[name] else 0.0
+        else:
+            continue
+        flag = 'REGRESSION' if change > threshold else ''
+        if flag:
+            regressions.append(name)
+        print(f'{name:<40}{previous[name]:>14}{current[name]:>14}{-change:>+9.1%} {flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--database-url', help='existing database to use (generated when empty)')
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--games', type=int, default=1000000)
+    parser.add_argument('--regions', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=200, help='requests per latency benchmark')
+    parser.add_argument('--only', help=f'comma-separated subset of: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before failing')
+    args = parser.parse_args()
+
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench_suite_"), "bench.db")}'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    from sqlalchemy import select, func
+    from sqlalchemy.engine import make_url
+    from app import app
+    from models import db, Player, Region, Game
+    from synthetic import generate
+
+    results = {}
+    with app.app_context():
+        db.create_all()
+        if db.session.scalar(select(Player.id).limit(1)) is None:
+            print(f'Generating {args.players} players and {args.games} games...')
+            summary = generate(args.players, args.games, args.regions, args.seed)
+            results['generate'] = {**summary, 'games_per_s': round(summary['games'] / summary['seconds'], 1)}
+        args.players = db.session.scalar(select(func.max(Player.id)))
+        args.regions = db.session.scalar(select(func.max(Region.id)))
+        games = db.session.scalar(select(func.count(Game.id)))
+
+    client = app.test_client()
+    client.post('/api/admin/login', json={'username': app.config['ADMIN_USERNAME'],
+                                          'password': app.config['ADMIN_PASSWORD']})
+    runners = {
+        'leaderboard': lambda rng: bench_leaderboard(app, client, rng, args),
+        'leaderboard_sql': lambda rng: bench_leaderboard(app, client, rng, args, use_snapshot=False),
+        'player_detail': lambda rng: bench_player_detail(app, client, rng, args),
+        'submit': lambda rng: bench_submit(app, client, rng, args),
+        'replay': lambda rng: bench_replay(app, client, rng, args),
+        'export': lambda rng: bench_export(app, client, rng, args),
+    }
+    for name in BENCHMARKS:
+        if name in selected:
+            results[name] = runners[name](random.Random(args.seed))
+            print(f'{name}: {json.dumps(results[name])}')
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': make_url(database_url).get_backend_name(),
+            'players': args.players,
+            'games': games,
+            'iterations': args.iterations
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            sys.exit(f'{len(regressions)} metrics regressed by more than {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
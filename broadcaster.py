@@ -0,0 +1,209 @@
+"""
+Server-Sent Events fan-out for live leaderboard updates.
+
+Writes publish one message per committed change; the broadcaster hands it
+to every subscribed client through a small bounded queue. A client that
+falls behind has its queue replaced by a single `reset` event (refetch the
+board) instead of growing without limit. Messages travel between worker
+processes through a pluggable backend: the local backend delivers
+in-process only, the file backend appends to a shared file that every
+process tails.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LocalBackend:
+    """Delivers messages to this process's subscribers only (single-process deployments)"""
+    deliver = None
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, message):
+        if self.deliver is not None:
+            self.deliver(message)
+
+
+class FileBackend:
+    """
+    Shares messages between processes on one host through an append-only file.
+
+    Each process tails the file from its end at start-up; the publisher
+    truncates it once it passes `max_bytes`, and tailers that see it shrink
+    tell their clients to resynchronize.
+    """
+
+    def __init__(self, path, poll_interval=0.25, max_bytes=1 << 20):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+
+    def start(self, deliver):
+        self.deliver = deliver
+        open(self.path, 'a').close()
+        thread = threading.Thread(target=self._tail, name='leaderboard-stream-tail', daemon=True)
+        thread.start()
+
+    def publish(self, message):
+        line = json.dumps(message) + '\n'
+        with open(self.path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            if f.tell() > self.max_bytes:
+                f.truncate(0)
+            f.write(line)
+
+    def _deliver_line(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            # Torn or corrupt line (e.g. read across a truncation): clients refetch instead
+            message = {'type': 'reset'}
+        self.deliver(message)
+
+    def _tail(self):
+        f = open(self.path)
+        f.seek(0, os.SEEK_END)
+        partial = ''
+        while True:
+            line = f.readline()
+            if line.endswith('\n'):
+                self._deliver_line(partial + line)
+                partial = ''
+                continue
+            partial += line
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                stat = None  # Removed; the next publish recreates it
+            if stat is not None and (stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < f.tell()):
+                # Truncated or replaced: read the current file from the start
+                f.close()
+                f = open(self.path)
+                partial = ''
+                self.deliver({'type': 'reset'})
+            time.sleep(self.poll_interval)
+
+
+def create_stream_backend(url):
+    """Build a backend from LEADERBOARD_STREAM_BACKEND (None or file:///path)"""
+    if not url:
+        return LocalBackend()
+    if url.startswith('file:///'):
+        return FileBackend(url[len('file://'):])
+    raise ValueError(f'Unsupported leaderboard stream backend: {url}')
+
+
+class Subscription:
+    """One connected client: a region filter and a bounded event queue"""
+
+    def __init__(self, region_id, queue_size):
+        self.region_id = region_id
+        self.events = queue.Queue(maxsize=queue_size)
+
+
+class LeaderboardBroadcaster:
+    """
+    Fans rank-delta messages out to SSE subscribers.
+
+    A `ranks` message carries the changed players' leaderboard rows with
+    their new global and regional ranks; regional subscribers receive only
+    their region's players, ranked within the region.
+    """
+
+    def __init__(self, queue_size=32, heartbeat_seconds=15, max_clients=1000):
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_clients = max_clients
+        self.backend = None
+        self._started = False
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.queue_size = app.config.get('STREAM_QUEUE_SIZE', self.queue_size)
+        self.heartbeat_seconds = app.config.get('STREAM_HEARTBEAT_SECONDS', self.heartbeat_seconds)
+        self.max_clients = app.config.get('STREAM_MAX_CLIENTS', self.max_clients)
+        self.backend = create_stream_backend(app.config.get('LEADERBOARD_STREAM_BACKEND'))
+
+    def publish(self, message):
+        if self.backend is not None:
+            self.backend.publish(message)
+
+    def subscribe(self, region_id=None):
+        """New subscription, or None when the client limit is reached"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            # Listen only once a client is connected, i.e. after any pre-fork import
+            if not self._started:
+                self.backend.start(self._deliver)
+                self._started = True
+            subscription = Subscription(region_id, self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @staticmethod
+    def _frame(event, data):
+        return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+    def _region_frame(self, message, region_id):
+        players = []
+        for player in message['players']:
+            if player['region_id'] == region_id:
+                players.append({**player, 'rank': player['region_rank'],
+                                'previous_rank': player['previous_region_rank']})
+        return self._frame('ranks', {**message, 'players': players}) if players else None
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        frames = {}
+        for subscription in subscribers:
+            region_id = subscription.region_id
+            if region_id not in frames:
+                if message['type'] != 'ranks':
+                    frames[region_id] = self._frame(message['type'], message)
+                elif region_id is None:
+                    frames[region_id] = self._frame('ranks', message)
+                else:
+                    frames[region_id] = self._region_frame(message, region_id)
+            frame = frames[region_id]
+            if frame is None:
+                continue
+            try:
+                subscription.events.put_nowait(frame)
+            except queue.Full:
+                # A slow client gets one reset in place of the backlog
+                with subscription.events.mutex:
+                    subscription.events.queue.clear()
+                subscription.events.put_nowait(self._frame('reset', {'type': 'reset'}))
+
+    def events(self, subscription):
+        """SSE body for one subscription: events as they come, heartbeat comments in between"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    yield subscription.events.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Global leaderboard broadcaster instance
+leaderboard_broadcaster = LeaderboardBroadcaster()
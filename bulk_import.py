@@ -0,0 +1,272 @@
+"""
+Bulk import of historical games.
+
+Accepts JSON Lines (one game per line) or CSV (one participant per row):
+
+    {"played_at": "2024-03-01T19:00:00", "results": [{"player_id": 1, "placement": 1, "points": 15}, ...]}
+
+    game,played_at,player_id,placement,points
+    a1,2024-03-01T19:00:00,1,1,15
+    a1,2024-03-01T19:00:00,2,2,11
+
+Players may be referenced by `player_id` or `player_name`. Every game is
+validated before anything is written, then ratings are applied in
+chronological order against in-memory copies of the referenced players
+(vectorized over runs of games that share no player), and the rows are
+written with executemany inserts, one transaction per chunk. Games older than existing history are rated from the players'
+current ratings; run `python replay.py` afterwards to rebuild later games.
+
+Usage:
+    python bulk_import.py games.jsonl [--format csv] [--chunk-size 5000] [--strict]
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, or_, select
+from models import db, Player, PlayerState, Game, GameParticipant
+from rating_system import rating_system
+from checkpoints import invalidate_checkpoints
+from head_to_head import pair_deltas, apply_deltas
+from region_stats import record_region_games, rating_buckets, current_ratings, update_histogram
+from config import Config
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp into the naive UTC datetimes the models store"""
+    if value in (None, ''):
+        return None
+    timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_jsonl(lines):
+    """Yield (line_number, record_or_error) for each non-blank JSON line"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'Invalid JSON: {e}')
+
+
+def parse_csv(lines):
+    """Group consecutive CSV rows sharing a `game` value into game records"""
+    reader = csv.DictReader(lines)
+    current_ref, start_line, record = None, None, None
+    for row in reader:
+        ref = row.get('game')
+        if record is None or ref != current_ref:
+            if record is not None:
+                yield start_line, record
+            current_ref, start_line = ref, reader.line_num
+            record = {'played_at': row.get('played_at'), 'results': []}
+        record['results'].append({
+            'player_id': row.get('player_id') or None,
+            'player_name': row.get('player_name') or None,
+            'placement': row.get('placement'),
+            'points': row.get('points'),
+        })
+    if record is not None:
+        yield start_line, record
+
+
+def _player_ref(result):
+    if result.get('player_id') not in (None, ''):
+        try:
+            return int(result['player_id'])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid player_id: {result['player_id']!r}")
+    if result.get('player_name'):
+        return str(result['player_name']).strip()
+    raise ValueError('Each result needs a player_id or player_name')
+
+
+def normalize_game(record):
+    """Check one parsed game record and convert its fields, raising ValueError"""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError('Game must be an object')
+    results = record.get('results') or []
+    if not isinstance(results, list) or not all(isinstance(result, dict) for result in results):
+        raise ValueError('results must be a list of objects')
+    if len(results) < 2 or len(results) > 4:
+        raise ValueError('Game must have 2-4 players')
+
+    normalized = []
+    for result in results:
+        try:
+            placement = int(result['placement'])
+            points = int(result['points'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each result needs integer placement and points')
+        if placement < 1 or placement > len(results):
+            raise ValueError(f'Placement {placement} out of range')
+        normalized.append({'ref': _player_ref(result), 'placement': placement, 'points': points})
+
+    refs = [r['ref'] for r in normalized]
+    if len(set(refs)) != len(refs):
+        raise ValueError('Each player can only appear once per game')
+
+    try:
+        played_at = parse_timestamp(record.get('played_at'))
+    except ValueError:
+        raise ValueError(f"Invalid played_at: {record.get('played_at')}")
+    return {'played_at': played_at, 'results': normalized}
+
+
+def load_player_states(refs):
+    """Load every referenced player (by id or name) into PlayerState objects"""
+    ids = [ref for ref in refs if isinstance(ref, int)]
+    names = [ref for ref in refs if isinstance(ref, str)]
+    columns = [getattr(Player, column) for column in PlayerState.COLUMNS]
+    rows = db.session.execute(
+        select(Player.name, *columns).where(or_(Player.id.in_(ids), Player.name.in_(names)))
+    ).all()
+
+    states = {}
+    for row in rows:
+        state = PlayerState.from_row(row)
+        states[row.id] = state
+        states[row.name] = state
+    return states
+
+
+def import_games(records, chunk_size=None, strict=False, progress=None):
+    """
+    Validate, rate and insert a sequence of parsed game records.
+
+    Args:
+        records: Iterable of (line_number, record) from parse_jsonl/parse_csv
+        chunk_size: Games per transaction
+        strict: Import nothing if any game fails validation
+        progress: Optional callable(imported_so_far, total)
+
+    Returns:
+        Dict with counts, per-game errors and the ids of players whose
+        ratings changed
+    """
+    chunk_size = chunk_size or Config.BULK_IMPORT_CHUNK_SIZE
+    started = time.perf_counter()
+
+    games, errors = [], []
+    for line_number, record in records:
+        try:
+            games.append((line_number, normalize_game(record)))
+        except (TypeError, ValueError) as e:
+            errors.append({'line': line_number, 'error': str(e)})
+
+    states = load_player_states({r['ref'] for _, game in games for r in game['results']})
+    valid = []
+    for line_number, game in games:
+        missing = [r['ref'] for r in game['results'] if r['ref'] not in states]
+        if missing:
+            errors.append({'line': line_number, 'error': f'Player {missing[0]} not found'})
+        elif len({states[r['ref']].id for r in game['results']}) != len(game['results']):
+            errors.append({'line': line_number, 'error': 'Each player can only appear once per game'})
+        else:
+            valid.append(game)
+
+    if strict and errors:
+        return {'imported': 0, 'failed': len(errors), 'errors': errors, 'player_ids': [],
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    # Chronological order; games without a timestamp are stamped now and go last
+    now = datetime.utcnow()
+    for game in valid:
+        game['played_at'] = game['played_at'] or now
+    valid.sort(key=lambda game: game['played_at'])
+    if valid:
+        # Checkpoints past the first imported game no longer cover everything before them
+        invalidate_checkpoints(db.session, valid[0]['played_at'])
+
+    touched = set()
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        # Core table inserts skip ORM bulk-persistence bookkeeping
+        game_ids = db.session.scalars(
+            insert(Game.__table__).returning(Game.__table__.c.id, sort_by_parameter_order=True),
+            [{'played_at': game['played_at'], 'num_players': len(game['results'])} for game in chunk]
+        ).all()
+
+        participants, chunk_players, seats, region_games = [], {}, [], []
+        processed_games = rating_system.process_many([
+            [{'player': states[r['ref']], 'placement': r['placement'], 'points': r['points']}
+             for r in game['results']]
+            for game in chunk
+        ])
+        for game, game_id, processed in zip(chunk, game_ids, processed_games):
+            for res in processed:
+                state = res['player']
+                participants.append({
+                    'game_id': game_id,
+                    'player_id': state.id,
+                    'placement': res['placement'],
+                    'points': res['points'],
+                    'mu_before': res['mu_before'],
+                    'sigma_before': res['sigma_before'],
+                    'mu_after': res['mu_after'],
+                    'sigma_after': res['sigma_after']
+                })
+                state.record_result(res['placement'], res['points'], res['mu_after'], res['sigma_after'])
+                chunk_players[state.id] = state
+            seats.append([(res['player'].id, res['placement'], res['mu_after'] - res['mu_before']) for res in processed])
+            region_games.append((game['played_at'], [(res['player'].id, res['points']) for res in processed]))
+
+        db.session.execute(insert(GameParticipant.__table__), participants)
+        apply_deltas(db.session, pair_deltas(seats))
+        record_region_games(db.session, region_games)
+        histogram_before = rating_buckets(current_ratings(db.session, chunk_players))
+        db.session.execute(update(Player), [state.as_update() for state in chunk_players.values()])
+        update_histogram(db.session, histogram_before, rating_buckets(current_ratings(db.session, chunk_players)))
+        db.session.commit()
+        touched.update(chunk_players)
+        if progress:
+            progress(start + len(chunk), len(valid))
+
+    return {
+        'imported': len(valid),
+        'failed': len(errors),
+        'errors': errors,
+        'player_ids': sorted(touched),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def parse_stream(stream, fmt):
+    """Parse a text stream as 'jsonl' or 'csv'"""
+    if fmt == 'csv':
+        return parse_csv(stream)
+    if fmt == 'jsonl':
+        return parse_jsonl(stream)
+    raise ValueError(f'Unsupported format: {fmt}')
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app, publish_changes
+    from submission_queue import submission_queue
+
+    parser = argparse.ArgumentParser(description='Bulk import games from JSON Lines or CSV')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['jsonl', 'csv'])
+    parser.add_argument('--chunk-size', type=int, default=Config.BULK_IMPORT_CHUNK_SIZE)
+    parser.add_argument('--strict', action='store_true', help='import nothing if any game is invalid')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'jsonl')
+    with app.app_context(), submission_queue.exclusive(), io.open(args.path, newline='', encoding='utf-8') as f:
+        summary = import_games(
+            parse_stream(f, fmt), chunk_size=args.chunk_size, strict=args.strict,
+            progress=lambda done, total: print(f'{done}/{total} games imported')
+        )
+        if summary['imported']:
+            publish_changes(rebuild=True)
+    for error in summary['errors']:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Imported {summary['imported']} games, {summary['failed']} failed")
@@ -0,0 +1,228 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, make_response, g
+from sqlalchemy import select, update, insert
+from models import RatingsVersion
+
+
+class LocalVersionStore:
+    """Ratings version counter private to this process (single-worker setups only)"""
+
+    def __init__(self):
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, fresh=False):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def replica_get(self):
+        """Unknown: the replica does not see this counter"""
+        return None
+
+
+class SQLiteVersionStore:
+    """
+    Ratings version counter shared through a small SQLite file.
+
+    Lets every worker process on a host agree on the current version, so a
+    write handled by one gunicorn worker invalidates the others' caches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS ratings_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO ratings_version (id, version) VALUES (1, 0)')
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, fresh=False):
+        return self._connect().execute('SELECT version FROM ratings_version WHERE id = 1').fetchone()[0]
+
+    def bump(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE ratings_version SET version = version + 1 WHERE id = 1')
+            version = conn.execute('SELECT version FROM ratings_version WHERE id = 1').fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+
+    def replica_get(self):
+        """Unknown: the replica does not see this file"""
+        return None
+
+
+class DatabaseVersionStore:
+    """
+    Ratings version counter kept in the app database (the default).
+
+    Shared by every worker on every host and never reset by a restart, so
+    a version number always means the same data. Each process keeps its
+    own copy and re-reads the row at most every `ttl` seconds (or when
+    asked for a fresh value), so cache hits and 304s stay off the database
+    and another worker's write is noticed within `ttl`.
+    """
+
+    def __init__(self, db, ttl=1.0):
+        self.db = db
+        self.ttl = ttl
+        self._version = None
+        self._checked = None
+
+    @staticmethod
+    def _read(engine):
+        with engine.connect() as conn:
+            return conn.scalar(select(RatingsVersion.version).where(RatingsVersion.id == 1)) or 0
+
+    def _remember(self, version):
+        self._version, self._checked = version, time.monotonic()
+        return version
+
+    def get(self, fresh=False):
+        checked = self._checked
+        if fresh or checked is None or time.monotonic() - checked >= self.ttl:
+            return self._remember(self._read(self.db.engine))
+        return self._version
+
+    def replica_get(self):
+        """Version the read replica has replayed so far (the row replicates with the data)"""
+        return self._read(self.db.engines.get('replica') or self.db.engine)
+
+    def bump(self):
+        with self.db.engine.begin() as conn:
+            bumped = conn.execute(
+                update(RatingsVersion).where(RatingsVersion.id == 1).values(version=RatingsVersion.version + 1)
+            ).rowcount
+            if not bumped:
+                conn.execute(insert(RatingsVersion).values(id=1, version=1))
+            version = conn.scalar(select(RatingsVersion.version).where(RatingsVersion.id == 1))
+        return self._remember(version)
+
+
+def create_version_store(url, db=None, ttl=1.0):
+    """Build a version store from RESPONSE_CACHE_BACKEND (None for the app database, memory:// or sqlite:///path)"""
+    if not url:
+        return DatabaseVersionStore(db, ttl)
+    if url == 'memory://':
+        return LocalVersionStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteVersionStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported response cache backend: {url}')
+
+
+class ResponseCache:
+    """
+    Bounded LRU of serialized GET responses keyed by route and query args.
+
+    Entries are tagged with the ratings version they were rendered at and
+    are only served while that version is current. ETags are derived from
+    the version and the cache key alone, so a matching If-None-Match is
+    answered with 304 before the view (and the database) is touched.
+    A view reading a replica that has not reached the current version is
+    served without an ETag and not cached.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.versions = LocalVersionStore()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db=None):
+        self.max_entries = app.config['RESPONSE_CACHE_SIZE']
+        self.versions = create_version_store(app.config['RESPONSE_CACHE_BACKEND'], db,
+                                             app.config['RESPONSE_CACHE_VERSION_TTL'])
+
+    def version(self, fresh=False):
+        """Current ratings version; `fresh` skips any per-process copy"""
+        return self.versions.get(fresh)
+
+    def bump_version(self):
+        """Invalidate every cached response (call after a committed write)"""
+        return self.versions.bump()
+
+    def _rendered_at(self, version):
+        """Ratings version the view will read: the replica's for public reads, otherwise `version`"""
+        if not (g.get('read_replica') and current_app.config['DATABASE_REPLICA_URL']):
+            return version
+        return self.versions.replica_get()
+
+    @staticmethod
+    def _key():
+        return (request.path, tuple(sorted(request.args.items(multi=True))))
+
+    @staticmethod
+    def _etag(version, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return f'v{version}-{digest}'
+
+    def _get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, view):
+        """Decorator adding ETag/304 handling and response caching to a GET view"""
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config['RESPONSE_CACHE_ENABLED']:
+                return view(*args, **kwargs)
+
+            # Requests kept on the primary (admins) must see their own writes at once
+            version = self.version(fresh=g.get('read_replica') is False)
+            key = self._key()
+            etag = self._etag(version, key)
+
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                entry = self._get(key, version)
+                if entry is not None:
+                    response = make_response(entry[1], 200)
+                    response.mimetype = entry[2]
+                else:
+                    rendered_at = self._rendered_at(version)
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or rendered_at != version:
+                        return response
+                    self._put(key, (version, response.get_data(), response.mimetype))
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = current_app.config['CACHE_CONTROL']
+            return response
+        return decorated_function
+
+
+# Global response cache instance
+response_cache = ResponseCache()
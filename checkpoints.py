@@ -0,0 +1,230 @@
+"""
+Point-in-time ratings from periodic checkpoints.
+
+A checkpoint stores the mu, sigma and counters of every player who has
+played, after all games up to a boundary in rating order (played_at,
+game id). The state at any moment is the nearest earlier checkpoint plus
+the participations after it, so a historical leaderboard reads
+O(players + delta) rows instead of the whole history. Checkpoints are
+built the same way from the previous one, never from the players table,
+so they always agree with the stored participant snapshots.
+
+The submission writer adds one every CHECKPOINT_INTERVAL_GAMES games or
+CHECKPOINT_INTERVAL_HOURS of play. Edits, backdated imports and replays
+drop the checkpoints at or after the earliest point they rewrote.
+
+Usage:
+    python checkpoints.py [--rebuild] [--interval 1000]
+"""
+import time
+from datetime import timedelta
+from sqlalchemy import select, insert, delete, func, or_, and_
+from models import db, Player, PlayerState, Game, GameParticipant, RatingCheckpoint, CheckpointRating
+from rating_system import rating_system
+from serialization import select_players, player_row
+from config import Config
+
+STATE_COLUMNS = (
+    CheckpointRating.player_id, CheckpointRating.mu, CheckpointRating.sigma, CheckpointRating.games_played,
+    CheckpointRating.first_place, CheckpointRating.second_place, CheckpointRating.third_place,
+    CheckpointRating.fourth_place, CheckpointRating.total_points
+)
+
+
+def after_key(played_at, game_id):
+    """SQL condition selecting games strictly after (played_at, game_id) in rating order"""
+    return or_(Game.played_at > played_at, and_(Game.played_at == played_at, Game.id > game_id))
+
+
+def up_to_key(played_at, game_id=None):
+    """Games at or before (played_at, game_id); every game at `played_at` when game_id is None"""
+    if game_id is None:
+        return Game.played_at <= played_at
+    return or_(Game.played_at < played_at, and_(Game.played_at == played_at, Game.id <= game_id))
+
+
+def latest_checkpoint(session, played_at=None, game_id=None):
+    """Nearest checkpoint at or before (played_at, game_id), or the newest one"""
+    query = select(RatingCheckpoint)
+    if played_at is not None and game_id is None:
+        query = query.where(RatingCheckpoint.played_at <= played_at)
+    elif played_at is not None:
+        query = query.where(or_(
+            RatingCheckpoint.played_at < played_at,
+            and_(RatingCheckpoint.played_at == played_at, RatingCheckpoint.game_id <= game_id)
+        ))
+    return session.scalars(
+        query.order_by(RatingCheckpoint.played_at.desc(), RatingCheckpoint.game_id.desc()).limit(1)
+    ).first()
+
+
+def states_at(session, played_at, game_id=None):
+    """
+    Every rated player's state after the games up to (played_at, game_id).
+
+    Returns:
+        (dict of player id -> PlayerState, checkpoint used or None, delta games applied)
+    """
+    checkpoint = latest_checkpoint(session, played_at, game_id)
+    states = {}
+    condition = up_to_key(played_at, game_id)
+    if checkpoint is not None:
+        rows = session.execute(select(*STATE_COLUMNS).where(CheckpointRating.checkpoint_id == checkpoint.id))
+        for values in rows.tuples():
+            states[values[0]] = PlayerState.from_values(values)
+        condition = and_(after_key(checkpoint.played_at, checkpoint.game_id), condition)
+
+    rows = session.execute(
+        select(GameParticipant.game_id, GameParticipant.player_id, GameParticipant.placement, GameParticipant.points,
+               GameParticipant.mu_after, GameParticipant.sigma_after)
+        .join(Game, Game.id == GameParticipant.game_id)
+        .where(condition)
+        .order_by(Game.played_at, Game.id)
+    )
+    delta = set()
+    for game_id_, player_id, placement, points, mu_after, sigma_after in rows:
+        state = states.get(player_id)
+        if state is None:
+            state = states[player_id] = PlayerState(id=player_id)
+        state.record_result(placement, points, mu_after, sigma_after)
+        delta.add(game_id_)
+    return states, checkpoint, len(delta)
+
+
+def write_checkpoint(session):
+    """Checkpoint at the last game in rating order (caller commits); None if there are no games"""
+    last = session.execute(select(Game.played_at, Game.id).order_by(Game.played_at.desc(), Game.id.desc()).limit(1)).first()
+    if last is None:
+        return None
+    states, previous, delta = states_at(session, last.played_at, last.id)
+    checkpoint = RatingCheckpoint(played_at=last.played_at, game_id=last.id, games=(previous.games if previous else 0) + delta)
+    session.add(checkpoint)
+    session.flush()
+    _insert_states(session, checkpoint.id, states.values())
+    return checkpoint
+
+
+def _insert_states(session, checkpoint_id, states):
+    rows = [{'checkpoint_id': checkpoint_id, 'player_id': state.id,
+             **{c: getattr(state, c) for c in PlayerState.COLUMNS[1:]}} for state in states]
+    for start in range(0, len(rows), Config.REPLAY_BATCH_SIZE):
+        session.execute(insert(CheckpointRating.__table__), rows[start:start + Config.REPLAY_BATCH_SIZE])
+
+
+def checkpoint_due(session):
+    """Whether enough games or play time has passed since the newest checkpoint"""
+    checkpoint = latest_checkpoint(session)
+    last_played = session.scalar(select(func.max(Game.played_at)))
+    if last_played is None:
+        return False
+    if checkpoint is None:
+        newer = select(Game.id)
+    else:
+        if last_played - checkpoint.played_at >= timedelta(hours=Config.CHECKPOINT_INTERVAL_HOURS):
+            return True
+        newer = select(Game.id).where(after_key(checkpoint.played_at, checkpoint.game_id))
+    # Counting stops at the interval, so this is cheap however far behind it is
+    count = session.scalar(select(func.count()).select_from(newer.limit(Config.CHECKPOINT_INTERVAL_GAMES).subquery()))
+    return count >= Config.CHECKPOINT_INTERVAL_GAMES
+
+
+def invalidate_checkpoints(session, played_at=None, game_id=0):
+    """Drop checkpoints at or after (played_at, game_id), or all of them (caller commits)"""
+    stale = select(RatingCheckpoint.id)
+    if played_at is not None:
+        stale = stale.where(or_(
+            RatingCheckpoint.played_at > played_at,
+            and_(RatingCheckpoint.played_at == played_at, RatingCheckpoint.game_id >= game_id)
+        ))
+    stale_ids = session.scalars(stale).all()
+    if stale_ids:
+        session.execute(delete(CheckpointRating).where(CheckpointRating.checkpoint_id.in_(stale_ids)))
+        session.execute(delete(RatingCheckpoint).where(RatingCheckpoint.id.in_(stale_ids)))
+    return len(stale_ids)
+
+
+def rebuild_checkpoints(interval=None, batch_size=None, progress=None):
+    """Replace every checkpoint with one per `interval` games in a single pass over history"""
+    from replay import stream_games
+
+    interval = interval or Config.CHECKPOINT_INTERVAL_GAMES
+    batch_size = batch_size or Config.REPLAY_BATCH_SIZE
+    session = db.session
+    started = time.perf_counter()
+    invalidate_checkpoints(session)
+
+    states, games, written = {}, 0, 0
+    for game_id, rows in stream_games(session, batch_size):
+        for row in rows:
+            state = states.get(row.player_id)
+            if state is None:
+                state = states[row.player_id] = PlayerState(id=row.player_id)
+            state.record_result(row.placement, row.points, row.mu_after, row.sigma_after)
+        games += 1
+        if games % interval == 0:
+            checkpoint = RatingCheckpoint(played_at=rows[0].played_at, game_id=game_id, games=games)
+            session.add(checkpoint)
+            session.flush()
+            _insert_states(session, checkpoint.id, states.values())
+            written += 1
+        if progress and games % batch_size == 0:
+            progress(games)
+    session.commit()
+    return {'games': games, 'checkpoints': written, 'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+
+def leaderboard_as_of(as_of, region_id=None, limit=None, offset=0, after_id=None):
+    """
+    Ranked leaderboard rows as they stood at `as_of` (every game played at or before it).
+
+    Players are listed with their current name and region; those created
+    later who had not played by then are left out.
+    """
+    session = db.session
+    states, _, _ = states_at(session, as_of)
+    initial = rating_system.create_initial_rating()
+    query = select_players()
+    if region_id:
+        query = query.where(Player.region_id == region_id)
+
+    board = []
+    for row in session.execute(query):
+        state = states.get(row.id)
+        if state is None:
+            if row.created_at > as_of:
+                continue
+            state = PlayerState(id=row.id, mu=initial.mu, sigma=initial.sigma)
+        board.append((-state.mu, row.id, row, state))
+    board.sort(key=lambda entry: entry[:2])
+
+    start = max(offset or 0, 0)
+    if after_id is not None:
+        start = next((i + 1 for i, entry in enumerate(board) if entry[1] == after_id), None)
+        if start is None:
+            return []
+    stop = len(board) if limit is None else min(start + max(limit, 0), len(board))
+    page = []
+    for rank, (_, _, row, state) in enumerate(board[start:stop], start + 1):
+        player_data = player_row(tuple(row[:4]) + tuple(getattr(state, c) for c in PlayerState.COLUMNS[1:]) + (row.created_at,))
+        player_data['rank'] = rank
+        page.append(player_data)
+    return page
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Rebuild the rating checkpoints from game history')
+    parser.add_argument('--rebuild', action='store_true', help='replace every checkpoint in one pass')
+    parser.add_argument('--interval', type=int, default=Config.CHECKPOINT_INTERVAL_GAMES, help='games per checkpoint')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.rebuild:
+            summary = rebuild_checkpoints(args.interval, progress=lambda done: print(f'{done} games'))
+            print(f"{summary['checkpoints']} checkpoints over {summary['games']} games in {summary['elapsed_ms']} ms")
+        else:
+            checkpoint = write_checkpoint(db.session)
+            db.session.commit()
+            print(f'Checkpoint {checkpoint.id} at game {checkpoint.game_id}' if checkpoint else 'No games yet')
@@ -20,6 +20,114 @@ class Config:
     SQLALCHEMY_DATABASE_URI = DATABASE_URL or 'sqlite:///splendor_ratings.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replica for public GET endpoints (writes and logged-in admins stay on the primary)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith('postgres://'):
+        DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    
+    # Database engine tuning (DB_ENGINE_TUNING=0 falls back to SQLAlchemy's defaults)
+    DB_ENGINE_TUNING = os.environ.get('DB_ENGINE_TUNING', '1') != '0'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    if DB_ENGINE_TUNING and not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),  # Connections kept open per process
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),  # Extra connections under bursts
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),  # Seconds to wait for a free connection
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Replace connections older than this
+            'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',  # Test connections on checkout
+        }
+    # Run on every new SQLite connection
+    SQLITE_PRAGMAS = {}
+    if DB_ENGINE_TUNING:
+        SQLITE_PRAGMAS = {
+            'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),  # Readers never block the writer
+            'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),  # Safe with WAL, far fewer fsyncs
+            'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),  # Wait for locks instead of failing
+            'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # Bytes read via mmap
+        }
+    
+    # Leaderboard
+    # Serve rankings from an in-process snapshot patched on every write
+    # instead of sorting the players table on each request; other workers
+    # reload the players a write touched when the shared ratings version
+    # (RESPONSE_CACHE_BACKEND) moves
+    LEADERBOARD_SNAPSHOT = os.environ.get('LEADERBOARD_SNAPSHOT', '1') != '0'
+    LEADERBOARD_PAGE_CACHE_SIZE = 256  # Serialized pages kept per snapshot version
+    LEADERBOARD_SYNC_MAX_VERSIONS = int(os.environ.get('LEADERBOARD_SYNC_MAX_VERSIONS', 1000))  # Change sets kept; a worker further behind rebuilds
+    
+    # HTTP caching for the public read API
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))  # LRU entries per process
+    # Where the ratings version lives: unset for the app database (shared by every worker and host),
+    # sqlite:////tmp/splendor_cache.db for one host, or memory:// for a single process
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND')
+    # Seconds a worker trusts its copy of the database-held version before re-reading it
+    RESPONSE_CACHE_VERSION_TTL = float(os.environ.get('RESPONSE_CACHE_VERSION_TTL', 1.0))
+    CACHE_CONTROL = os.environ.get('CACHE_CONTROL') or 'no-cache'
+    
+    # Rating history
+    HISTORY_CACHE_SIZE = int(os.environ.get('HISTORY_CACHE_SIZE', 256))  # Players kept as packed arrays
+    HISTORY_MAX_POINTS = 5000  # Upper bound for ?points= downsampling
+    # Point-in-time checkpoints (each stores one row per rated player)
+    CHECKPOINT_INTERVAL_GAMES = int(os.environ.get('CHECKPOINT_INTERVAL_GAMES', 10000))  # Games between checkpoints
+    CHECKPOINT_INTERVAL_HOURS = float(os.environ.get('CHECKPOINT_INTERVAL_HOURS', 24))  # Or hours of play, whichever first
+    
+    # Region statistics rollups
+    RATING_HISTOGRAM_WIDTH = int(os.environ.get('RATING_HISTOGRAM_WIDTH', 50))  # mu per histogram bucket (rebuild after changing)
+    REGION_STATS_MAX_PERIODS = 366  # Upper bound for ?periods= on /api/regions/<id>/stats
+    
+    # Serialization (orjson is used when installed)
+    GAME_CACHE_SIZE = int(os.environ.get('GAME_CACHE_SIZE', 4096))  # Encoded games kept per process
+    
+    # Outcome predictions
+    PREDICT_MAX_TABLES = int(os.environ.get('PREDICT_MAX_TABLES', 10000))  # Tables per /api/predict call
+    
+    # Round table assignment
+    MATCHMAKING_TIME_BUDGET_MS = int(os.environ.get('MATCHMAKING_TIME_BUDGET_MS', 500))
+    MATCHMAKING_REPEAT_PENALTY = 0.5  # Draw-probability points given up per repeated pairing
+    MATCHMAKING_MAX_TIME_BUDGET_MS = MATCHMAKING_TIME_BUDGET_MS * 10  # Cap for a requested time_budget_ms
+    
+    # Monte Carlo simulator
+    SIMULATION_SEASONS = int(os.environ.get('SIMULATION_SEASONS', 100000))  # Default seasons per forecast
+    SIMULATION_MAX_SEASONS = int(os.environ.get('SIMULATION_MAX_SEASONS', 1000000))  # Cap for /api/admin/simulate
+    SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', 1))  # Processes per forecast
+    SIMULATION_MAX_WORKERS = int(os.environ.get('SIMULATION_MAX_WORKERS', os.cpu_count() or 1))  # Cap for `workers`
+    SIMULATION_BATCH_SIZE = 2000  # Seasons stacked into one set of arrays
+    SIMULATION_SIGMA_THRESHOLD = 100.0  # Sigma at which a new player's rating counts as settled
+    
+    # Queued game submission
+    SUBMISSION_BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE', 200))  # Queued games per writer transaction
+    SUBMISSION_POLL_INTERVAL = float(os.environ.get('SUBMISSION_POLL_INTERVAL', 0.2))  # Seconds between queue scans
+    SUBMISSION_MAX_WAIT = 10.0  # Longest ?wait= a submission request may block for
+    SUBMISSION_LOCK_PATH = os.environ.get('SUBMISSION_LOCK_PATH')  # Writer election lock file (default: temp dir)
+    
+    # Live leaderboard stream (Server-Sent Events)
+    # None delivers rank events only to clients of the process that applied the game;
+    # any deployment with more than one worker needs file:///path
+    LEADERBOARD_STREAM_BACKEND = os.environ.get('LEADERBOARD_STREAM_BACKEND')
+    STREAM_QUEUE_SIZE = 32  # Events buffered per client before it is told to reset
+    STREAM_HEARTBEAT_SECONDS = 15  # Comment frame interval that keeps idle connections open
+    STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 1000))  # Subscribers per process
+    
+    # Streaming export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))  # Cursor rows fetched / lines per chunk
+    
+    # Bulk game import
+    BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', 5000))  # Games per transaction
+    
+    # Rating replay
+    REPLAY_BATCH_SIZE = int(os.environ.get('REPLAY_BATCH_SIZE', 5000))  # Cursor rows / updates per batch
+    REPLAY_MAX_BATCH_SIZE = 100000  # Cap for a requested batch_size
+    REPLAY_WORKERS = int(os.environ.get('REPLAY_WORKERS', 1))  # Processes for full replays (1 = serial)
+    REPLAY_MAX_WORKERS = int(os.environ.get('REPLAY_MAX_WORKERS', os.cpu_count() or 1))  # Cap for `workers`
+    
+    # Instrumentation (Server-Timing headers, /api/admin/metrics, slow-request profiles)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '0') != '0'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # Write cProfile dumps of slow sampled requests here
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.1))  # Share of requests run under cProfile
+    PROFILE_THRESHOLD_MS = int(os.environ.get('PROFILE_THRESHOLD_MS', 500))  # Keep profiles of requests slower than this
+    
     # Admin credentials
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME') or 'admin'
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD') or 'splendor2024'
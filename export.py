@@ -0,0 +1,131 @@
+"""
+Streaming export of games and players as NDJSON or CSV.
+
+Rows come from a server-side cursor (stream_results + yield_per) and are
+encoded into text chunks as they arrive, so memory stays flat however long
+the history is. Games are exported in id order. A nightly sync passes the
+last game id it received as `since_id` to fetch only newer games.
+
+NDJSON game lines and CSV participant rows use the field names that
+bulk_import.py reads, so an export can be imported into another instance.
+"""
+import csv
+import io
+from itertools import groupby
+from operator import attrgetter
+from flask import current_app
+from sqlalchemy import select
+from models import db, Player, Region, Game, GameParticipant
+from config import Config
+
+PARTICIPANT_FIELDS = ('player_id', 'player_name', 'placement', 'points',
+                      'mu_before', 'sigma_before', 'mu_after', 'sigma_after')
+
+GAME_CSV_HEADER = ('game', 'played_at', 'num_players') + PARTICIPANT_FIELDS
+
+PLAYER_FIELDS = ('id', 'name', 'region_id', 'region_name', 'mu', 'sigma', 'games_played',
+                 'first_place', 'second_place', 'third_place', 'fourth_place', 'total_points')
+
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _stream(stmt, batch_size):
+    return db.session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+
+
+def _chunks(lines, lines_per_chunk):
+    """Join lines into chunks; the first line goes out on its own so the response starts at once"""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= lines_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _csv_line(values):
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+
+def game_rows(since_id=None, batch_size=None):
+    """Yield (game_id, [participant rows]) for games after `since_id`, in id order"""
+    stmt = select(
+        Game.id.label('game_id'), Game.played_at, Game.num_players,
+        GameParticipant.player_id, Player.name.label('player_name'),
+        GameParticipant.placement, GameParticipant.points,
+        GameParticipant.mu_before, GameParticipant.sigma_before,
+        GameParticipant.mu_after, GameParticipant.sigma_after
+    ).join(GameParticipant, GameParticipant.game_id == Game.id)\
+        .join(Player, Player.id == GameParticipant.player_id)\
+        .order_by(Game.id, GameParticipant.placement, GameParticipant.id)
+    if since_id is not None:
+        stmt = stmt.where(Game.id > since_id)
+    return groupby(_stream(stmt, batch_size or Config.EXPORT_BATCH_SIZE), key=attrgetter('game_id'))
+
+
+def export_games(fmt='ndjson', since_id=None, batch_size=None):
+    """Yield text chunks of the game history: one line per game (NDJSON) or per participant (CSV)"""
+    batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+    dumps = current_app.json.dumps
+
+    def ndjson():
+        for game_id, rows in game_rows(since_id, batch_size):
+            rows = list(rows)
+            yield dumps({
+                'id': game_id,
+                'played_at': rows[0].played_at.isoformat(),
+                'num_players': rows[0].num_players,
+                'results': [{field: getattr(row, field) for field in PARTICIPANT_FIELDS} for row in rows]
+            }) + '\n'
+
+    def csv_lines():
+        yield _csv_line(GAME_CSV_HEADER)
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for game_id, rows in game_rows(since_id, batch_size):
+            for row in rows:
+                writer.writerow((game_id, row.played_at.isoformat(), row.num_players)
+                                + tuple(getattr(row, field) for field in PARTICIPANT_FIELDS))
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+
+    return _chunks(ndjson() if fmt == 'ndjson' else csv_lines(), batch_size)
+
+
+def export_players(fmt='ndjson', region_id=None, batch_size=None):
+    """Yield text chunks with every player's current rating and counters"""
+    batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+    stmt = select(
+        Player.id, Player.name, Player.region_id, Region.name.label('region_name'),
+        Player.mu, Player.sigma, Player.games_played, Player.first_place, Player.second_place,
+        Player.third_place, Player.fourth_place, Player.total_points
+    ).outerjoin(Region, Region.id == Player.region_id).order_by(Player.id)
+    if region_id is not None:
+        stmt = stmt.where(Player.region_id == region_id)
+    dumps = current_app.json.dumps
+
+    def ndjson():
+        for row in _stream(stmt, batch_size):
+            yield dumps(dict(zip(PLAYER_FIELDS, row))) + '\n'
+
+    def csv_lines():
+        yield _csv_line(PLAYER_FIELDS)
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for row in _stream(stmt, batch_size):
+            writer.writerow(row)
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+
+    return _chunks(ndjson() if fmt == 'ndjson' else csv_lines(), batch_size)
@@ -0,0 +1,125 @@
+"""
+Head-to-head records between every pair of players who have met.
+
+Each shared game adds one to `games` and to `ahead`, `behind` or `tied`
+for both orientations of the pair (at most 12 rows for a 4-player game),
+plus the player's mu change to `rating_exchange`. Writers apply these
+increments as upserts in their own transaction; rewrites retract the old
+contribution of every game they re-rate and add the new one, and a full
+replay rebuilds the table with one INSERT ... SELECT.
+
+Usage:
+    python head_to_head.py   # rebuild from game history
+"""
+from collections import defaultdict
+from sqlalchemy import select, delete, insert, case, func, and_
+from models import db, Player, GameParticipant, HeadToHead, upsert_increments
+
+COUNTERS = ('games', 'ahead', 'behind', 'tied', 'rating_exchange')
+
+SORT_COLUMNS = {
+    'games': HeadToHead.games,
+    'ahead': HeadToHead.ahead,
+    'behind': HeadToHead.behind,
+    'rating_exchange': HeadToHead.rating_exchange,
+}
+
+
+def pair_deltas(games, sign=1, deltas=None):
+    """
+    Aggregate increments for the given games.
+
+    Args:
+        games: Iterable of games, each a list of (player_id, placement, mu_change)
+        sign: -1 to take the games back out
+        deltas: Existing result to add to
+
+    Returns:
+        Dict of (player_a, player_b) -> [games, ahead, behind, tied, rating_exchange]
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for seats in games:
+        for player_a, placement_a, change_a in seats:
+            for player_b, placement_b, _ in seats:
+                if player_a == player_b:
+                    continue
+                delta = deltas[(player_a, player_b)]
+                delta[0] += sign
+                delta[1 if placement_a < placement_b else 2 if placement_a > placement_b else 3] += sign
+                delta[4] += sign * change_a
+    return deltas
+
+
+def apply_deltas(session, deltas):
+    """Upsert the increments (caller commits); pairs that drop to zero games are deleted"""
+    rows = [{'player_a': a, 'player_b': b, **dict(zip(COUNTERS, delta))}
+            for (a, b), delta in deltas.items() if any(delta)]
+    if not rows:
+        return
+    upsert_increments(session, HeadToHead, ('player_a', 'player_b'), rows)
+    if any(delta[0] < 0 for delta in deltas.values()):
+        players = {a for a, _ in deltas}
+        session.execute(delete(HeadToHead).where(HeadToHead.player_a.in_(players), HeadToHead.games <= 0))
+
+
+def rebuild_head_to_head(session):
+    """Recompute every pair from the participations in one statement (caller commits)"""
+    a = GameParticipant.__table__.alias('a')
+    b = GameParticipant.__table__.alias('b')
+    pairs = select(
+        a.c.player_id, b.c.player_id, func.count(),
+        func.sum(case((a.c.placement < b.c.placement, 1), else_=0)),
+        func.sum(case((a.c.placement > b.c.placement, 1), else_=0)),
+        func.sum(case((a.c.placement == b.c.placement, 1), else_=0)),
+        func.sum(a.c.mu_after - a.c.mu_before)
+    ).join(b, and_(a.c.game_id == b.c.game_id, a.c.player_id != b.c.player_id))\
+        .group_by(a.c.player_id, b.c.player_id)
+    session.execute(delete(HeadToHead))
+    session.execute(insert(HeadToHead).from_select(['player_a', 'player_b', *COUNTERS], pairs))
+
+
+def record_dict(player_id, opponent_id, opponent_name, row):
+    games, ahead, behind, tied, rating_exchange = row if row is not None else (0, 0, 0, 0, 0.0)
+    return {
+        'player_id': player_id,
+        'opponent_id': opponent_id,
+        'opponent_name': opponent_name,
+        'games': games,
+        'ahead': ahead,
+        'behind': behind,
+        'tied': tied,
+        'win_rate': round(ahead / games * 100, 1) if games > 0 else 0,
+        'rating_exchange': int(round(rating_exchange))
+    }
+
+
+def rivals(player_id, sort='games', limit=20):
+    """A player's opponents, most games (or `sort`) first"""
+    column = SORT_COLUMNS[sort]
+    rows = db.session.execute(
+        select(HeadToHead.player_b, Player.name, *(getattr(HeadToHead, c) for c in COUNTERS))
+        .join(Player, Player.id == HeadToHead.player_b)
+        .where(HeadToHead.player_a == player_id)
+        .order_by(column.desc(), HeadToHead.games.desc(), HeadToHead.player_b)
+        .limit(limit)
+    )
+    return [record_dict(player_id, row[0], row[1], row[2:]) for row in rows]
+
+
+def versus(player_id, opponent_id, opponent_name):
+    """Record of one player against another (zeros if they never met)"""
+    row = db.session.execute(
+        select(*(getattr(HeadToHead, c) for c in COUNTERS))
+        .where(HeadToHead.player_a == player_id, HeadToHead.player_b == opponent_id)
+    ).first()
+    return record_dict(player_id, opponent_id, opponent_name, row)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        rebuild_head_to_head(db.session)
+        db.session.commit()
+        print(f'{db.session.scalar(select(func.count()).select_from(HeadToHead)) // 2} pairs')
@@ -0,0 +1,131 @@
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from models import db, Game, GameParticipant
+from config import Config
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_micros(timestamp):
+    """Naive UTC datetime -> integer microseconds since the epoch"""
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+class RatingHistory:
+    """A player's rating trajectory packed into parallel arrays, oldest first"""
+    __slots__ = ('game_ids', 'played_at', 'mu', 'sigma')
+
+    def __init__(self):
+        self.game_ids = array('q')
+        self.played_at = array('q')
+        self.mu = array('d')
+        self.sigma = array('d')
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    @classmethod
+    def load(cls, player_id):
+        """Read the trajectory through the (player_id, game_id) index"""
+        history = cls()
+        rows = db.session.execute(
+            select(GameParticipant.game_id, Game.played_at, GameParticipant.mu_after, GameParticipant.sigma_after)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .where(GameParticipant.player_id == player_id)
+            .order_by(Game.played_at, GameParticipant.game_id)
+        )
+        for game_id, played_at, mu, sigma in rows:
+            history.game_ids.append(game_id)
+            history.played_at.append(to_micros(played_at))
+            history.mu.append(mu)
+            history.sigma.append(sigma)
+        return history
+
+    def window(self, since=None, until=None):
+        """Index range [start, stop) of points with since <= played_at <= until"""
+        start = 0 if since is None else bisect.bisect_left(self.played_at, to_micros(since))
+        stop = len(self) if until is None else bisect.bisect_right(self.played_at, to_micros(until))
+        return start, max(start, stop)
+
+    def position_after(self, played_at_micros, game_id):
+        """Index of the first point strictly after (played_at, game_id)"""
+        index = bisect.bisect_left(self.played_at, played_at_micros)
+        while index < len(self) and (self.played_at[index], self.game_ids[index]) <= (played_at_micros, game_id):
+            index += 1
+        return index
+
+    def cursor(self, index):
+        return f'{self.played_at[index]}_{self.game_ids[index]}'
+
+    def points(self, indices):
+        """Columnar payload for the given point indices"""
+        return {
+            'game_id': [self.game_ids[i] for i in indices],
+            'played_at': [from_micros(self.played_at[i]).isoformat() for i in indices],
+            'mu': [int(round(self.mu[i])) for i in indices],
+            'sigma': [int(round(self.sigma[i])) for i in indices]
+        }
+
+
+def downsample(start, stop, points):
+    """At most `points` evenly spaced indices in [start, stop), always keeping both ends"""
+    if stop - start <= points:
+        return range(start, stop)
+    return np.unique(np.linspace(start, stop - 1, points).round().astype(int)).tolist()
+
+
+class HistoryCache:
+    """
+    Bounded LRU of packed per-player histories.
+
+    Follows the ratings version like the leaderboard snapshot: local writes
+    drop only the players they touched, while a version moved by another
+    process clears everything.
+    """
+
+    def __init__(self, max_players=256):
+        self.max_players = max_players
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, player_id, ratings_version):
+        with self._lock:
+            if self.version != ratings_version:
+                self._entries.clear()
+                self.version = ratings_version
+            history = self._entries.get(player_id)
+            if history is not None:
+                self._entries.move_to_end(player_id)
+                return history
+
+        history = RatingHistory.load(player_id)
+        with self._lock:
+            if self.version == ratings_version:
+                self._entries[player_id] = history
+                while len(self._entries) > self.max_players:
+                    self._entries.popitem(last=False)
+        return history
+
+    def advance(self, ratings_version, player_ids=None):
+        """Drop `player_ids` (or everything when None) after a local write"""
+        with self._lock:
+            if player_ids is None or self.version != ratings_version - 1:
+                self._entries.clear()
+            else:
+                for player_id in player_ids:
+                    self._entries.pop(player_id, None)
+            self.version = ratings_version
+
+
+# Global history cache instance
+history_cache = HistoryCache(max_players=Config.HISTORY_CACHE_SIZE)
@@ -0,0 +1,186 @@
+"""
+Opt-in per-request instrumentation.
+
+With INSTRUMENTATION_ENABLED every request records its query count and
+time spent in SQL (cursor execution), rating math and JSON encoding;
+whatever remains of the total is ORM hydration, to_dict and view logic.
+The breakdown is returned as a Server-Timing header and folded into
+per-endpoint latency histograms, exposed in Prometheus text format by
+`/api/admin/metrics`. With PROFILE_DIR set, a sample of requests runs
+under cProfile and the profiles of those slower than PROFILE_THRESHOLD_MS
+are written there. Metrics are per process.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+# Latency histogram bucket bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_enabled = False
+
+
+def _add(name, seconds):
+    timings = g.setdefault('timings', {})
+    timings[name] = timings.get(name, 0.0) + seconds
+
+
+def timed(name):
+    """Decorator adding the call's duration to the current request's `name` timing"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _enabled or not has_request_context():
+                return f(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _add(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with encoding time recorded as `serialize`"""
+
+    @timed('serialize')
+    def dumps(self, obj, **kwargs):
+        return super().dumps(obj, **kwargs)
+
+
+class EndpointMetrics:
+    """Latency histogram plus query totals for one (endpoint, method, status) series"""
+    __slots__ = ('buckets', 'count', 'total', 'queries', 'sql')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.sql = 0.0
+
+    def observe(self, seconds, queries, sql):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.queries += queries
+        self.sql += sql
+
+
+class Instrumentation:
+    """Request hooks, SQL cursor events, metrics registry and slow-request profiler"""
+
+    def __init__(self):
+        self.enabled = False
+        self.profile_dir = None
+        self.profile_sample_rate = 0.0
+        self.profile_threshold = 0.0
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, *engines):
+        global _enabled
+        self.enabled = _enabled = app.config.get('INSTRUMENTATION_ENABLED', False)
+        if not self.enabled:
+            return
+        self.profile_dir = app.config.get('PROFILE_DIR')
+        self.profile_sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_threshold = app.config.get('PROFILE_THRESHOLD_MS', 500) / 1000.0
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        if self.profile_dir and random.random() < self.profile_sample_rate:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and conn.info.get('query_started'):
+            _add('db', time.perf_counter() - conn.info['query_started'].pop())
+            g.query_count = g.get('query_count', 0) + 1
+
+    def _after_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed >= self.profile_threshold:
+                self._dump_profile(profiler, elapsed)
+
+        timings = g.get('timings', {})
+        queries = g.get('query_count', 0)
+        parts = [f'{name};dur={timings[name] * 1000:.2f}' for name in ('db', 'rating', 'serialize') if name in timings]
+        if 'db' in timings:
+            parts[0] += f';desc="{queries} queries"'
+        parts.append(f'app;dur={max(elapsed - sum(timings.values()), 0) * 1000:.2f}')
+        parts.append(f'total;dur={elapsed * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+
+        key = (request.url_rule.rule if request.url_rule else 'unmatched', request.method, response.status_code)
+        with self._lock:
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                metrics = self._metrics[key] = EndpointMetrics()
+            metrics.observe(elapsed, queries, timings.get('db', 0.0))
+        return response
+
+    def _dump_profile(self, profiler, elapsed):
+        endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{endpoint}_{elapsed * 1000:.0f}ms.prof"
+        profiler.dump_stats(os.path.join(self.profile_dir, name))
+
+    def prometheus(self):
+        """All series in Prometheus text exposition format"""
+        with self._lock:
+            series = sorted((key, (list(m.buckets), m.count, m.total, m.queries, m.sql))
+                            for key, m in self._metrics.items())
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by endpoint',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for (endpoint, method, status), (buckets, count, total, _, _) in series:
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+            for bound, observed in zip(BUCKETS, buckets):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {observed}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+        lines += ['# HELP http_request_queries_total SQL statements executed by endpoint',
+                  '# TYPE http_request_queries_total counter']
+        for (endpoint, method, status), (_, _, _, queries, _) in series:
+            lines.append(f'http_request_queries_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {queries}')
+        lines += ['# HELP http_request_sql_seconds_total Time spent executing SQL by endpoint',
+                  '# TYPE http_request_sql_seconds_total counter']
+        for (endpoint, method, status), (_, _, _, _, sql) in series:
+            lines.append(f'http_request_sql_seconds_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {sql:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+# Global instrumentation instance
+instrumentation = Instrumentation()
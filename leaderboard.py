@@ -0,0 +1,339 @@
+import bisect
+import json
+import threading
+from sqlalchemy import func, or_, and_, select, insert, delete
+from sqlalchemy.orm import joinedload
+from models import db, Player, Region, LeaderboardChange
+from serialization import PLAYER_COLUMNS, select_players, player_row, encode
+from config import Config
+
+
+def ranked_players_subquery(region_id=None):
+    """Subquery of (id, mu, rank) with ranks assigned by the database.
+
+    Ranks follow ORDER BY mu DESC, id ASC so ties are broken by seniority,
+    which keeps them stable between pages.
+    """
+    rank = func.row_number().over(order_by=(Player.mu.desc(), Player.id.asc()))
+    query = db.session.query(Player.id, Player.mu, rank.label('rank'))
+    if region_id:
+        query = query.filter(Player.region_id == region_id)
+    return query.subquery()
+
+
+def _leaderboard_query(entities, region_id=None, limit=None, offset=0, after_rating=None, after_id=None,
+                       join_region=False):
+    """Ranked, paged query selecting `entities` plus the rank (None if the keyset anchor is gone)"""
+    ranked = ranked_players_subquery(region_id)
+    query = db.session.query(*entities, ranked.c.rank)\
+        .join(ranked, Player.id == ranked.c.id)\
+        .order_by(ranked.c.rank)
+    if join_region:
+        query = query.outerjoin(Region, Region.id == Player.region_id)
+
+    if after_id is not None:
+        if after_rating is None:
+            # The public payload only carries the rounded rating, so resolve
+            # the exact mu of the anchor row from its id.
+            after_rating = db.session.query(Player.mu).filter(Player.id == after_id).scalar()
+            if after_rating is None:
+                return None
+        query = query.filter(or_(
+            ranked.c.mu < after_rating,
+            and_(ranked.c.mu == after_rating, ranked.c.id > after_id)
+        ))
+    elif offset:
+        query = query.offset(offset)
+
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def get_leaderboard_page(region_id=None, limit=None, offset=0, after_rating=None, after_id=None):
+    """
+    Fetch one page of the leaderboard sorted and ranked in SQL.
+
+    Args:
+        region_id: Optional region filter
+        limit: Maximum number of rows (None for the whole board)
+        offset: Rows to skip (ignored when keyset arguments are given)
+        after_rating: mu of the last row of the previous page
+        after_id: id of the last row of the previous page
+
+    Returns:
+        List of (Player, rank) tuples
+    """
+    query = _leaderboard_query((Player,), region_id, limit, offset, after_rating, after_id)
+    if query is None:
+        return []
+    return query.options(joinedload(Player.region)).all()
+
+
+def get_leaderboard_rows(region_id=None, limit=None, offset=0, after_rating=None, after_id=None):
+    """Same page as get_leaderboard_page, built as ranked row dicts straight from the result tuples"""
+    query = _leaderboard_query(PLAYER_COLUMNS, region_id, limit, offset, after_rating, after_id, join_region=True)
+    if query is None:
+        return []
+    page = []
+    for row in query:
+        player_data = player_row(row)
+        player_data['rank'] = row[-1]
+        page.append(player_data)
+    return page
+
+
+def get_player_rank(player, region_id=None):
+    """Rank of a single player without loading the rest of the board"""
+    query = db.session.query(func.count(Player.id)).filter(or_(
+        Player.mu > player.mu,
+        and_(Player.mu == player.mu, Player.id < player.id)
+    ))
+    if region_id:
+        query = query.filter(Player.region_id == region_id)
+    return query.scalar() + 1
+
+
+class LeaderboardSnapshot:
+    """
+    In-process ranked copy of the players table.
+
+    Keeps one list sorted by (-mu, id) for the global board and one per
+    region, plus the serialized row of every player. It is built once from
+    the database and then patched with only the players a write touched,
+    whether the write happened here or, through the leaderboard_changes
+    log, in another worker. All reads and patches happen under one lock and every patch bumps
+    `version`, so a reader never observes a half-applied game.
+    """
+
+    def __init__(self, page_cache_size=256):
+        self.version = 0
+        self.synced_version = None
+        self.page_cache_size = page_cache_size
+        self._lock = threading.RLock()
+        self._built = False
+        self._rows = {}
+        self._keys = {}
+        self._global = []
+        self._regions = {}
+        self._pages = {}
+
+    @staticmethod
+    def _key(player_id, mu):
+        return (-mu, player_id)
+
+    def build(self):
+        """Load every player from the database (requires an app context)"""
+        rows = db.session.execute(select_players().order_by(Player.id)).all()
+        with self._lock:
+            self._rows = {}
+            self._keys = {}
+            self._regions = {}
+            for row in rows:
+                player_id, region_id, mu = row.id, row.region_id, row.mu
+                self._rows[player_id] = (region_id, player_row(row))
+                self._keys[player_id] = self._key(player_id, mu)
+                self._regions.setdefault(region_id, []).append(self._keys[player_id])
+            self._global = sorted(self._keys.values())
+            for keys in self._regions.values():
+                keys.sort()
+            self._built = True
+            self._bump()
+
+    def ensure_built(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+
+    def invalidate(self):
+        """Force a rebuild on the next read"""
+        with self._lock:
+            self._built = False
+            self._bump()
+
+    def sync(self, ratings_version):
+        """Catch up with writes other processes made up to `ratings_version` (requires an app context)"""
+        if self.synced_version == ratings_version:
+            return
+        with self._lock:
+            synced = self.synced_version
+            if synced == ratings_version:
+                return
+            self.synced_version = ratings_version
+            if not self._built:
+                return
+            if (synced is None or not 0 < ratings_version - synced <= Config.LEADERBOARD_SYNC_MAX_VERSIONS
+                    or not self._apply_changes(synced, ratings_version)):
+                self._built = False
+
+    def _apply_changes(self, after, ratings_version):
+        """Reload the players logged for versions after..ratings_version, False if the log cannot cover them"""
+        changes = db.session.execute(
+            select(LeaderboardChange.player_ids, LeaderboardChange.rebuild)
+            .where(LeaderboardChange.version > after, LeaderboardChange.version <= ratings_version)
+        ).all()
+        # A missing version is still being logged by its writer or was pruned
+        if len(changes) != ratings_version - after or any(rebuild for _, rebuild in changes):
+            return False
+        player_ids = set().union(*(json.loads(ids) for ids, _ in changes))
+        if len(player_ids) > len(self._rows) // 2:
+            return False
+        if player_ids:
+            rows = db.session.execute(select_players().where(Player.id.in_(player_ids))).all()
+            for player_id in player_ids:
+                self._remove(player_id)
+            for row in rows:
+                self._insert(row.id, row.mu, row.region_id, player_row(row))
+            self._bump()
+        return True
+
+    def advance(self, ratings_version):
+        """Record that local patches brought the snapshot to `ratings_version`"""
+        with self._lock:
+            if self.synced_version == ratings_version - 1:
+                self.synced_version = ratings_version
+            else:
+                self.sync(ratings_version)
+
+    def _bump(self):
+        self.version += 1
+        self._pages.clear()
+
+    def _remove(self, player_id):
+        key = self._keys.pop(player_id, None)
+        if key is None:
+            return
+        region_id = self._rows.pop(player_id)[0]
+        for keys in (self._global, self._regions.get(region_id, [])):
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def _insert(self, player_id, mu, region_id, row):
+        key = self._key(player_id, mu)
+        self._keys[player_id] = key
+        self._rows[player_id] = (region_id, row)
+        bisect.insort(self._global, key)
+        bisect.insort(self._regions.setdefault(region_id, []), key)
+
+    def update_players(self, players):
+        """
+        Insert or re-rank the given Player objects.
+
+        Returns:
+            The players' new rows with global and regional rank before and
+            after the patch (empty if the snapshot is not built)
+        """
+        if not self._built:
+            return []
+        rows = [(player.id, player.mu, player.region_id, player.to_dict()) for player in players]
+        with self._lock:
+            previous = {player_id: (self._rank_of(player_id, None), self._rank_of(player_id, region_id),
+                                    self._rows[player_id][1]['rating'] if player_id in self._rows else None)
+                        for player_id, _, region_id, _ in rows}
+            for player_id, mu, region_id, row in rows:
+                self._remove(player_id)
+                self._insert(player_id, mu, region_id, row)
+            self._bump()
+
+            changes = []
+            for player_id, _, region_id, row in rows:
+                rank, region_rank, rating = previous[player_id]
+                changes.append({
+                    **row,
+                    'rank': self._rank_of(player_id, None),
+                    'region_rank': self._rank_of(player_id, region_id),
+                    'previous_rank': rank,
+                    'previous_region_rank': region_rank,
+                    'rating_change': row['rating'] - rating if rating is not None else None
+                })
+            return changes
+
+    def remove_players(self, player_ids):
+        if not self._built:
+            return
+        with self._lock:
+            for player_id in player_ids:
+                self._remove(player_id)
+            self._bump()
+
+    def _board(self, region_id):
+        return self._regions.get(region_id, []) if region_id else self._global
+
+    def page(self, region_id=None, limit=None, offset=0, after_rating=None, after_id=None):
+        """Same contract as get_leaderboard_page but returns ranked row dicts"""
+        self.ensure_built()
+        with self._lock:
+            board = self._board(region_id)
+            if after_id is not None:
+                if after_rating is None:
+                    anchor = self._keys.get(after_id)
+                    if anchor is None:
+                        return []
+                else:
+                    anchor = self._key(after_id, after_rating)
+                start = bisect.bisect_right(board, anchor)
+            else:
+                start = max(offset or 0, 0)
+            stop = len(board) if limit is None else min(start + max(limit, 0), len(board))
+            page = []
+            for rank, key in enumerate(board[start:stop], start + 1):
+                row = dict(self._rows[key[1]][1])
+                row['rank'] = rank
+                page.append(row)
+            return page
+
+    def page_json(self, region_id=None, limit=None, offset=0, after_rating=None, after_id=None):
+        """Serialized page, cached until the next patch"""
+        self.ensure_built()
+        cache_key = (region_id, limit, offset, after_rating, after_id)
+        with self._lock:
+            body = self._pages.get(cache_key)
+            if body is None:
+                rows = self.page(region_id, limit, offset, after_rating, after_id)
+                body = encode(rows)
+                if len(self._pages) >= self.page_cache_size:
+                    self._pages.pop(next(iter(self._pages)))
+                self._pages[cache_key] = body
+            return body
+
+    def players_json(self):
+        """Serialized /api/players payload (players in id order)"""
+        self.ensure_built()
+        with self._lock:
+            body = self._pages.get('players')
+            if body is None:
+                rows = [self._rows[player_id][1] for player_id in sorted(self._rows)]
+                body = encode(rows)
+                self._pages['players'] = body
+            return body
+
+    def _rank_of(self, player_id, region_id):
+        key = self._keys.get(player_id)
+        if key is None or (region_id and self._rows[player_id][0] != region_id):
+            return None
+        return bisect.bisect_left(self._board(region_id), key) + 1
+
+    def rank(self, player_id, region_id=None):
+        """1-based rank of a player, or None if it is not on that board"""
+        self.ensure_built()
+        with self._lock:
+            return self._rank_of(player_id, region_id)
+
+
+def log_changes(ratings_version, player_ids=(), rebuild=False):
+    """Record the players `ratings_version` touched for other workers' snapshots (own transaction)"""
+    with db.engine.begin() as conn:
+        # Rows at or past this version are left over from a version store that was reset
+        conn.execute(delete(LeaderboardChange).where(or_(
+            LeaderboardChange.version >= ratings_version,
+            LeaderboardChange.version <= ratings_version - Config.LEADERBOARD_SYNC_MAX_VERSIONS
+        )))
+        conn.execute(insert(LeaderboardChange).values(
+            version=ratings_version, player_ids=json.dumps(sorted(set(player_ids))), rebuild=rebuild
+        ))
+
+
+# Global snapshot instance
+leaderboard_snapshot = LeaderboardSnapshot(page_cache_size=Config.LEADERBOARD_PAGE_CACHE_SIZE)
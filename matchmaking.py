@@ -0,0 +1,162 @@
+"""
+Table assignment for a tournament round.
+
+Splits checked-in players into 3-4 player tables that maximize the summed
+match quality (openskill's draw probability) while avoiding pairings
+that already happened. Seeding is greedy: players sorted by rating fill
+consecutive tables, which already groups similar skill. A time-boxed
+local search then swaps seats between tables whenever that raises
+quality minus the repeat-pairing penalty.
+"""
+import random
+import time
+from itertools import combinations, groupby
+from operator import itemgetter
+from sqlalchemy import select
+from models import db, Player, Game, GameParticipant
+from rating_system import rating_system
+from config import Config
+
+
+def table_sizes(num_players):
+    """As many 4-player tables as possible, the rest of 3; None if impossible"""
+    threes = (4 - num_players % 4) % 4
+    fours = (num_players - 3 * threes) // 4
+    if num_players < 3 or fours < 0:
+        return None
+    return [4] * fours + [3] * threes
+
+
+def prior_pairings(player_ids, since=None):
+    """
+    Count how often each pair of the given players shared a game.
+
+    One indexed query fetches the checked-in players' participations; the
+    pairs are counted in Python, which avoids a self-join over the table.
+    """
+    stmt = select(GameParticipant.game_id, GameParticipant.player_id)\
+        .where(GameParticipant.player_id.in_(player_ids))\
+        .order_by(GameParticipant.game_id)
+    if since is not None:
+        stmt = stmt.join(Game, Game.id == GameParticipant.game_id).where(Game.played_at >= since)
+
+    pairings = {}
+    for _, rows in groupby(db.session.execute(stmt), key=itemgetter(0)):
+        for pair in combinations(sorted(row[1] for row in rows), 2):
+            pairings[pair] = pairings.get(pair, 0) + 1
+    return pairings
+
+
+class TableAssigner:
+    """Greedy seeding plus local-search swaps for one pool of players"""
+
+    def __init__(self, players, pairings, repeat_penalty, rng):
+        self.players = sorted(players, key=lambda p: (-p[1], p[0]))
+        self.pairings = pairings
+        self.repeat_penalty = repeat_penalty
+        self.rng = rng
+
+    def repeats(self, table):
+        return sum(self.pairings.get((min(a, b), max(a, b)), 0)
+                   for a, b in combinations([p[0] for p in table], 2))
+
+    def quality(self, table):
+        return rating_system.draw_probability([p[1] for p in table], [p[2] for p in table])
+
+    def score(self, table):
+        return self.quality(table) - self.repeat_penalty * self.repeats(table)
+
+    def assign(self, deadline):
+        sizes = table_sizes(len(self.players))
+        tables, start = [], 0
+        for size in sizes:
+            tables.append(self.players[start:start + size])
+            start += size
+        scores = [self.score(table) for table in tables]
+
+        iterations = 0
+        while len(tables) > 1 and time.perf_counter() < deadline:
+            iterations += 1
+            i = self.rng.randrange(len(tables))
+            # Mostly try neighbouring tables, where similar ratings make swaps likely to pay off
+            if self.rng.random() < 0.8:
+                j = min(max(i + self.rng.choice((-2, -1, 1, 2)), 0), len(tables) - 1)
+            else:
+                j = self.rng.randrange(len(tables))
+            if i == j:
+                continue
+            a = self.rng.randrange(len(tables[i]))
+            b = self.rng.randrange(len(tables[j]))
+            first, second = list(tables[i]), list(tables[j])
+            first[a], second[b] = second[b], first[a]
+            first_score, second_score = self.score(first), self.score(second)
+            if first_score + second_score > scores[i] + scores[j] + 1e-12:
+                tables[i], tables[j] = first, second
+                scores[i], scores[j] = first_score, second_score
+        return tables, iterations
+
+
+def assign_round(player_ids, by_region=False, since=None, time_budget_ms=None,
+                 repeat_penalty=None, seed=None):
+    """
+    Assign checked-in players to tables for one round.
+
+    Args:
+        player_ids: Checked-in player ids
+        by_region: Keep each region's players at their own tables
+        since: Only count pairings from games played at or after this time
+        time_budget_ms: Local search budget shared by all pools
+        repeat_penalty: Quality given up per repeated pairing
+        seed: Optional seed for a reproducible search
+
+    Returns:
+        Summary dict with the tables, or raises ValueError for impossible pools
+    """
+    started = time.perf_counter()
+    time_budget_ms = time_budget_ms if time_budget_ms is not None else Config.MATCHMAKING_TIME_BUDGET_MS
+    repeat_penalty = repeat_penalty if repeat_penalty is not None else Config.MATCHMAKING_REPEAT_PENALTY
+
+    rows = db.session.execute(
+        select(Player.id, Player.mu, Player.sigma, Player.region_id).where(Player.id.in_(player_ids))
+    ).all()
+    missing = set(player_ids) - {row.id for row in rows}
+    if missing:
+        raise LookupError(f'Player {min(missing)} not found')
+
+    pools = {}
+    for row in rows:
+        pools.setdefault(row.region_id if by_region else None, []).append((row.id, row.mu, row.sigma))
+    for region_id, pool in pools.items():
+        if table_sizes(len(pool)) is None:
+            where = f' in region {region_id}' if region_id is not None else ''
+            raise ValueError(f'{len(pool)} players{where} cannot be split into 3-4 player tables')
+
+    pairings = prior_pairings(player_ids, since)
+    deadline = started + time_budget_ms / 1000.0
+    rng = random.Random(seed)
+
+    result, iterations = [], 0
+    players_left = len(rows)
+    for region_id, pool in sorted(pools.items(), key=lambda item: item[0] or 0):
+        assigner = TableAssigner(pool, pairings, repeat_penalty, rng)
+        # Each pool gets the share of the remaining budget matching its size
+        now = time.perf_counter()
+        tables, pool_iterations = assigner.assign(now + max(deadline - now, 0) * len(pool) / players_left)
+        players_left -= len(pool)
+        iterations += pool_iterations
+        for table in tables:
+            result.append({
+                'table': len(result) + 1,
+                'region_id': region_id,
+                'players': [p[0] for p in table],
+                'quality': assigner.quality(table),
+                'repeat_pairs': assigner.repeats(table)
+            })
+
+    return {
+        'tables': result,
+        'total_quality': sum(t['quality'] for t in result),
+        'repeat_pairs': sum(t['repeat_pairs'] for t in result),
+        'iterations': iterations,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -1,7 +1,93 @@
+from contextlib import contextmanager
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """Session that runs reads on the `replica` bind when the current request allows it
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self._db.engines.get('replica')
+        if (replica is not None and bind is None and not self._flushing and has_app_context()
+                and g.get('read_replica') and not getattr(clause, 'is_dml', False)):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def on_primary():
+    """Read from the primary inside the block (for fills of process-wide caches)"""
+    previous = g.get('read_replica', False)
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run `PRAGMA name=value` on every new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+# INSERT ... ON CONFLICT constructs for counter tables
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def upsert_increments(session, model, keys, rows):
+    """Insert `rows`, adding their other columns onto existing rows with the same `keys` (caller commits)"""
+    dialect = session.get_bind().dialect.name
+    if dialect not in UPSERTS:
+        raise ValueError(f'Incremental upserts are not supported on {dialect}')
+    stmt = UPSERTS[dialect](model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[getattr(model, key) for key in keys],
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in rows[0] if column not in keys}
+    )
+    session.execute(stmt, rows)
+
+
+# Per-placement counter columns on Player
+PLACEMENT_FIELDS = {1: 'first_place', 2: 'second_place', 3: 'third_place', 4: 'fourth_place'}
+
+
+class RatingRecordMixin:
+    """Shared bookkeeping for anything that tracks a player's rating and stats"""
+    
+    def record_result(self, placement, points, mu, sigma):
+        """Apply one game's outcome to the rating and aggregate counters"""
+        self.mu = mu
+        self.sigma = sigma
+        self.add_result(placement, points)
+    
+    def add_result(self, placement, points, count=1):
+        """Adjust only the aggregate counters (count=-1 takes a game back out)"""
+        self.games_played += count
+        self.total_points += points * count
+        field = PLACEMENT_FIELDS.get(placement)
+        if field:
+            setattr(self, field, getattr(self, field) + count)
+    
+    def remove_result(self, placement, points):
+        self.add_result(placement, points, count=-1)
 
 
 class Region(db.Model):
@@ -23,9 +109,14 @@ class Region(db.Model):
         }
 
 
-class Player(db.Model):
+class Player(RatingRecordMixin, db.Model):
     """Player model with a single assigned region and rating"""
     __tablename__ = 'players'
+    __table_args__ = (
+        # Leaderboard reads are ORDER BY mu DESC, optionally within a region
+        db.Index('ix_players_mu', 'mu'),
+        db.Index('ix_players_region_mu', 'region_id', 'mu'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -86,6 +177,10 @@ class Player(db.Model):
 class Game(db.Model):
     """Game model storing match results"""
     __tablename__ = 'games'
+    __table_args__ = (
+        # Rating order for replays and history scans
+        db.Index('ix_games_played_at_id', 'played_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     played_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -103,9 +198,22 @@ class Game(db.Model):
         }
 
 
+class GameRevision(db.Model):
+    """How often a game's participants were rewritten (no row means never)"""
+    __tablename__ = 'game_revisions'
+    
+    # No foreign key: a deleted game's row stays, so an id SQLite hands out again starts at a fresh revision
+    game_id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+
+
 class GameParticipant(db.Model):
     """Junction table linking players to games with their results"""
     __tablename__ = 'game_participants'
+    __table_args__ = (
+        db.Index('ix_game_participants_game', 'game_id'),
+        db.Index('ix_game_participants_player_game', 'player_id', 'game_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False)
@@ -140,3 +248,171 @@ class GameParticipant(db.Model):
             'mu_before': int(round(self.mu_before)),
             'mu_after': int(round(self.mu_after))
         }
+
+
+class GameSubmission(db.Model):
+    """A queued game submission; its id is the ticket handed back to the client"""
+    __tablename__ = 'game_submissions'
+    __table_args__ = (
+        # The writer's scan for the oldest queued submissions
+        db.Index('ix_game_submissions_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), unique=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, applied or failed
+    error = db.Column(db.String(200))
+    game_id = db.Column(db.Integer)  # No foreign key, so deleting the game keeps the ticket readable
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'ticket': self.id,
+            'status': self.status,
+            'error': self.error,
+            'game_id': self.game_id,
+            'submitted_at': self.submitted_at.isoformat(),
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+
+class HeadToHead(db.Model):
+    """player_a's record against player_b over every game they shared (stored in both directions)"""
+    __tablename__ = 'head_to_head'
+    
+    player_a = db.Column(db.Integer, db.ForeignKey('players.id'), primary_key=True)
+    player_b = db.Column(db.Integer, db.ForeignKey('players.id'), primary_key=True)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    ahead = db.Column(db.Integer, nullable=False, default=0)  # player_a placed better
+    behind = db.Column(db.Integer, nullable=False, default=0)
+    tied = db.Column(db.Integer, nullable=False, default=0)
+    rating_exchange = db.Column(db.Float, nullable=False, default=0.0)  # Sum of player_a's mu change in those games
+
+
+class RegionPeriodStats(db.Model):
+    """Games, points and active players of one region over one day or week (UTC, weeks start Monday)"""
+    __tablename__ = 'region_period_stats'
+    
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.id'), primary_key=True)
+    period = db.Column(db.String(4), primary_key=True)  # day or week
+    period_start = db.Column(db.Date, primary_key=True)
+    games = db.Column(db.Integer, nullable=False, default=0)  # Games with at least one of the region's players
+    participations = db.Column(db.Integer, nullable=False, default=0)
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    active_players = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'period_start': self.period_start.isoformat(),
+            'games': self.games,
+            'participations': self.participations,
+            'active_players': self.active_players,
+            'average_points': round(self.total_points / self.participations, 2) if self.participations > 0 else 0
+        }
+
+
+class PlayerPeriodActivity(db.Model):
+    """Games a player played in a period; counted into RegionPeriodStats.active_players"""
+    __tablename__ = 'player_period_activity'
+    
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.id'), primary_key=True)
+    period = db.Column(db.String(4), primary_key=True)
+    period_start = db.Column(db.Date, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id'), primary_key=True)
+    games = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RegionRatingBucket(db.Model):
+    """Current number of a region's players whose mu falls in one fixed-width bucket"""
+    __tablename__ = 'region_rating_buckets'
+    
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.id'), primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)  # floor(mu / RATING_HISTOGRAM_WIDTH)
+    players = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RatingsVersion(db.Model):
+    """Single-row counter bumped after every committed rating write, shared by all workers"""
+    __tablename__ = 'ratings_versions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LeaderboardChange(db.Model):
+    """Players one ratings version touched, so other workers patch their snapshot instead of rebuilding it"""
+    __tablename__ = 'leaderboard_changes'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    player_ids = db.Column(db.Text, nullable=False)  # JSON list of added, re-rated or removed players
+    rebuild = db.Column(db.Boolean, nullable=False, default=False)  # Bulk write: reload every player
+
+
+class RatingCheckpoint(db.Model):
+    """Ratings after every game up to (played_at, game_id) in rating order"""
+    __tablename__ = 'rating_checkpoints'
+    __table_args__ = (
+        # Nearest checkpoint at or before a point in history
+        db.Index('ix_rating_checkpoints_played_at_game', 'played_at', 'game_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    played_at = db.Column(db.DateTime, nullable=False)
+    game_id = db.Column(db.Integer, nullable=False)  # No foreign key; rewriting that game drops the checkpoint
+    games = db.Column(db.Integer, nullable=False)  # Games covered
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'played_at': self.played_at.isoformat(),
+            'game_id': self.game_id,
+            'games': self.games,
+            'created_at': self.created_at.isoformat()
+        }
+
+
+class CheckpointRating(db.Model):
+    """One player's rating and counters at a checkpoint (players with games only)"""
+    __tablename__ = 'checkpoint_ratings'
+    
+    checkpoint_id = db.Column(db.Integer, db.ForeignKey('rating_checkpoints.id'), primary_key=True)
+    player_id = db.Column(db.Integer, primary_key=True)
+    mu = db.Column(db.Float, nullable=False)
+    sigma = db.Column(db.Float, nullable=False)
+    games_played = db.Column(db.Integer, nullable=False)
+    first_place = db.Column(db.Integer, nullable=False)
+    second_place = db.Column(db.Integer, nullable=False)
+    third_place = db.Column(db.Integer, nullable=False)
+    fourth_place = db.Column(db.Integer, nullable=False)
+    total_points = db.Column(db.Integer, nullable=False)
+
+
+class PlayerState(RatingRecordMixin):
+    """Plain in-memory copy of a player's rating columns for batch processing"""
+    __slots__ = ('id', 'mu', 'sigma', 'games_played', 'first_place', 'second_place',
+                 'third_place', 'fourth_place', 'total_points')
+    
+    COLUMNS = __slots__
+    
+    def __init__(self, **values):
+        for column in self.COLUMNS:
+            setattr(self, column, values.get(column) or 0)
+    
+    @classmethod
+    def from_row(cls, row):
+        return cls(**row._mapping)
+    
+    @classmethod
+    def from_values(cls, values):
+        """State from a tuple in COLUMNS order"""
+        state = cls.__new__(cls)
+        (state.id, state.mu, state.sigma, state.games_played, state.first_place, state.second_place,
+         state.third_place, state.fourth_place, state.total_points) = values
+        return state
+    
+    def as_update(self):
+        """Parameters for an executemany UPDATE of the players table"""
+        return {column: getattr(self, column) for column in self.COLUMNS}
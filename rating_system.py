@@ -1,4 +1,9 @@
+import math
+from itertools import permutations
+from statistics import NormalDist
+import numpy as np
 from openskill.models import PlackettLuce, PlackettLuceRating
+from instrumentation import timed
 from config import Config
 
 
@@ -18,6 +23,7 @@ class RatingSystem:
         """Create initial rating for a new player"""
         return PlackettLuceRating(mu=Config.OPENSKILL_MU, sigma=Config.OPENSKILL_SIGMA)
     
+    @timed('rating')
     def calculate_new_ratings(self, mu_sigma_list, ranks):
         """
         Calculate new ratings for a match.
@@ -33,6 +39,150 @@ class RatingSystem:
         new_teams = self.model.rate(teams, ranks=ranks)
         return [(t[0].mu, t[0].sigma) for t in new_teams]
     
+    @timed('rating')
+    def rate_many(self, mu, sigma, ranks, game_sizes):
+        """
+        Vectorized Plackett-Luce update for many independent games.
+        
+        Games are laid out back to back in the flat input arrays and grouped
+        by size internally, so one call can mix 2, 3 and 4 player games. A
+        player must not appear in two games of the same call, since every
+        game is rated from the ratings passed in. Matches
+        `calculate_new_ratings` (openskill's PlackettLuce.rate) to within
+        floating point rounding.
+        
+        Args:
+            mu: Array of player means, one entry per participant
+            sigma: Array of player deviations, aligned with `mu`
+            ranks: Array of placements (lower is better, equal values tie)
+            game_sizes: Array with the number of participants of each game
+        
+        Returns:
+            Tuple of (new_mu, new_sigma) arrays aligned with the inputs
+        """
+        mu = np.asarray(mu, dtype=float)
+        sigma = np.asarray(sigma, dtype=float)
+        ranks = np.asarray(ranks, dtype=float)
+        game_sizes = np.asarray(game_sizes, dtype=int)
+        starts = np.concatenate(([0], np.cumsum(game_sizes)[:-1]))
+        
+        new_mu = np.empty_like(mu)
+        new_sigma = np.empty_like(sigma)
+        for size in np.unique(game_sizes):
+            index = starts[game_sizes == size][:, None] + np.arange(size)
+            new_mu[index], new_sigma[index] = self._rate_same_size(mu[index], sigma[index], ranks[index])
+        return new_mu, new_sigma
+    
+    def _rate_same_size(self, mu, sigma, ranks):
+        """Plackett-Luce update for a (games x players) block of equal-size games"""
+        model = self.model
+        sigma_squared = sigma ** 2 + model.tau ** 2
+        c = np.sqrt(np.sum(sigma_squared + model.beta ** 2, axis=1))[:, None]
+        exp_mu = np.exp(mu / c)
+        
+        # at_or_below[g, q, i]: team i finished at or behind team q
+        at_or_below = ranks[:, None, :] >= ranks[:, :, None]
+        sum_q = np.einsum('gqi,gi->gq', at_or_below, exp_mu)
+        ties = np.sum(ranks[:, None, :] == ranks[:, :, None], axis=2)
+        
+        # share[g, i, q] = exp(mu_i / c) / sum_q, counted where q finished at or ahead of i
+        share = exp_mu[:, :, None] / sum_q[:, None, :]
+        counted = np.swapaxes(at_or_below, 1, 2) / ties[:, None, :]
+        identity = np.eye(mu.shape[1])[None, :, :]
+        omega = np.sum(counted * (identity - share), axis=2)
+        delta = np.sum(counted * share * (1 - share), axis=2)
+        
+        omega *= sigma_squared / c
+        delta *= sigma_squared / c ** 2
+        delta *= np.sqrt(sigma_squared) / c
+        
+        new_mu = mu + omega
+        new_sigma = np.sqrt(sigma_squared) * np.sqrt(np.maximum(1 - delta, model.kappa))
+        return new_mu, new_sigma
+    
+    @timed('rating')
+    def predict_many(self, mu, sigma, table_sizes):
+        """
+        Vectorized outcome predictions for many candidate tables.
+        
+        Tables are laid out back to back in the flat input arrays, like
+        `rate_many`. Win and placement probabilities come from the
+        Plackett-Luce model; the draw probability is openskill's
+        `predict_draw`, which doubles as a match-quality score (closer
+        tables draw more often).
+        
+        Args:
+            mu: Array of player means, one entry per seat
+            sigma: Array of player deviations, aligned with `mu`
+            table_sizes: Array with the number of players at each table
+        
+        Returns:
+            Dict with `win` (per seat), `placement` (per seat, one column per
+            finishing position, padded with zeros to 4) and `draw` (per table)
+        """
+        mu = np.asarray(mu, dtype=float)
+        sigma = np.asarray(sigma, dtype=float)
+        table_sizes = np.asarray(table_sizes, dtype=int)
+        starts = np.concatenate(([0], np.cumsum(table_sizes)[:-1]))
+        
+        win = np.empty_like(mu)
+        placement = np.zeros((len(mu), 4))
+        draw = np.empty(len(table_sizes))
+        for size in np.unique(table_sizes):
+            tables = table_sizes == size
+            index = starts[tables][:, None] + np.arange(size)
+            block_placement = self._placement_probabilities(mu[index], sigma[index])
+            placement[index, :size] = block_placement
+            win[index] = block_placement[:, :, 0]
+            draw[tables] = self._draw_probabilities(mu[index], sigma[index])
+        return {'win': win, 'placement': placement, 'draw': draw}
+    
+    def _placement_probabilities(self, mu, sigma):
+        """(tables x players x positions) Plackett-Luce placement probabilities"""
+        size = mu.shape[1]
+        c = np.sqrt(np.sum(sigma ** 2 + self.model.beta ** 2, axis=1))[:, None]
+        # Subtract the row max before exponentiating; the ratios are unchanged
+        strength = np.exp((mu - mu.max(axis=1, keepdims=True)) / c)
+        
+        # Probability of every finishing order: product over positions of the
+        # finisher's strength divided by the strength of everyone still left
+        orders = np.array(list(permutations(range(size))))
+        ordered = strength[:, orders]
+        remaining = np.cumsum(ordered[:, :, ::-1], axis=2)[:, :, ::-1]
+        order_probability = np.prod(ordered / remaining, axis=2)
+        
+        # positions[o, i, p] is 1 when order o puts player i in position p
+        positions = np.zeros((len(orders), size, size))
+        positions[np.arange(len(orders))[:, None], orders, np.arange(size)] = 1.0
+        return np.einsum('to,oip->tip', order_probability, positions)
+    
+    def _draw_probabilities(self, mu, sigma):
+        """openskill's PlackettLuce.predict_draw for a block of equal-size tables"""
+        size = mu.shape[1]
+        beta = self.model.beta
+        draw_margin = math.sqrt(size) * beta * _normal.inv_cdf((1 + 1 / size) / 2)
+        a, b = np.array(list(permutations(range(size), 2))).T
+        spread = np.sqrt(size * beta ** 2 + sigma[:, a] ** 2 + sigma[:, b] ** 2)
+        gap = mu[:, a] - mu[:, b]
+        pairwise = _normal_cdf((draw_margin - gap) / spread) - _normal_cdf((gap - draw_margin) / spread)
+        denominator = size * (size - 1) if size > 2 else 1
+        return np.abs(pairwise.sum(axis=1)) / denominator
+    
+    @timed('rating')
+    def draw_probability(self, mus, sigmas):
+        """Scalar predict_draw for one table of plain floats (fast path for search loops)"""
+        size = len(mus)
+        beta_squared = self.model.beta ** 2
+        draw_margin = math.sqrt(size) * self.model.beta * _normal.inv_cdf((1 + 1 / size) / 2)
+        total = 0.0
+        for a in range(size):
+            for b in range(size):
+                if a != b:
+                    spread = math.sqrt(size * beta_squared + sigmas[a] ** 2 + sigmas[b] ** 2)
+                    gap = mus[a] - mus[b]
+                    total += _normal.cdf((draw_margin - gap) / spread) - _normal.cdf((gap - draw_margin) / spread)
+        return abs(total) / (size * (size - 1) if size > 2 else 1)
+    
     def process_game_results(self, player_results):
         """
         Process game results and calculate new ratings for all players.
@@ -64,6 +214,71 @@ class RatingSystem:
             })
             
         return processed_results
+    
+    def process_many(self, games):
+        """
+        Rate a chronological sequence of games in vectorized batches.
+        
+        Consecutive games that share no player are rated together with
+        `rate_many`; a game that reuses a player starts a new batch, so the
+        result is the same as calling `process_game_results` game by game
+        and applying each outcome before the next.
+        
+        Args:
+            games: List of `process_game_results` inputs, oldest first
+        
+        Returns:
+            List of `process_game_results` outputs, one per game
+        """
+        current = {}
+        processed_games = []
+        for batch in independent_runs(games):
+            results = [r for game in batch for r in game]
+            before = [current.get(id(r['player']), (r['player'].mu, r['player'].sigma)) for r in results]
+            new_mu, new_sigma = self.rate_many(
+                [mu for mu, _ in before], [sigma for _, sigma in before],
+                [r['placement'] for r in results], [len(game) for game in batch]
+            )
+            processed = []
+            for r, (mu, sigma), mu_after, sigma_after in zip(results, before, new_mu.tolist(), new_sigma.tolist()):
+                current[id(r['player'])] = (mu_after, sigma_after)
+                processed.append({
+                    'player': r['player'],
+                    'placement': r['placement'],
+                    'points': r['points'],
+                    'mu_before': mu,
+                    'sigma_before': sigma,
+                    'mu_after': mu_after,
+                    'sigma_after': sigma_after
+                })
+            start = 0
+            for game in batch:
+                processed_games.append(processed[start:start + len(game)])
+                start += len(game)
+        return processed_games
+
+
+_normal = NormalDist()
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def _normal_cdf(x):
+    """Standard normal CDF over an array (same formula as statistics.NormalDist)"""
+    return 0.5 * (1.0 + _erf(x / math.sqrt(2.0)).astype(float))
+
+
+def independent_runs(games):
+    """Split an ordered list of games into runs of consecutive games sharing no player"""
+    run, seen = [], set()
+    for game in games:
+        players = {id(r['player']) for r in game}
+        if not seen.isdisjoint(players):
+            yield run
+            run, seen = [], set()
+        run.append(game)
+        seen.update(players)
+    if run:
+        yield run
 
 
 # Global rating system instance
@@ -0,0 +1,205 @@
+"""
+Per-region rollups for dashboards.
+
+`region_period_stats` keeps games, participations, points and active
+players per region and UTC day or week (weeks start on Monday);
+`player_period_activity` holds the distinct players behind each active
+count. `region_rating_buckets` counts every region's players per
+fixed-width mu bucket. Writers update all three in their own transaction,
+so a dashboard reads a handful of rows however long the history gets.
+
+Rollups depend on who played when and for how many points, never on
+ratings, so only the histogram has to follow replays and rating edits.
+
+Usage:
+    python region_stats.py   # rebuild from game history and current ratings
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from sqlalchemy import select, delete, update, insert, literal, bindparam, cast, func, Date
+from models import (db, Player, Game, GameParticipant, RegionPeriodStats, PlayerPeriodActivity,
+                    RegionRatingBucket, upsert_increments)
+from config import Config
+
+PERIODS = ('day', 'week')
+
+
+def period_start(period, played_at):
+    """First day of the day or week containing `played_at`"""
+    day = played_at.date()
+    return day if period == 'day' else day - timedelta(days=day.weekday())
+
+
+def period_start_sql(period, column, dialect):
+    """SQL expression for period_start() of a timestamp column"""
+    if dialect == 'postgresql':
+        return cast(func.date_trunc(period, column), Date)
+    if dialect == 'sqlite':
+        return func.date(column) if period == 'day' else func.date(column, 'weekday 0', '-6 days')
+    raise ValueError(f'Region rollups are not supported on {dialect}')
+
+
+def record_region_games(session, games, sign=1):
+    """
+    Add games to the period rollups, or take them back out (caller commits).
+
+    Args:
+        games: Iterable of (played_at, [(player_id, points), ...])
+        sign: -1 to retract games that are being edited or deleted
+    """
+    games = list(games)
+    player_ids = {player_id for _, seats in games for player_id, _ in seats}
+    if not player_ids:
+        return
+    regions = dict(session.execute(select(Player.id, Player.region_id).where(Player.id.in_(player_ids))).all())
+
+    stats = defaultdict(lambda: [0, 0, 0])
+    activity = Counter()
+    for played_at, seats in games:
+        for period in PERIODS:
+            start = period_start(period, played_at)
+            for region_id in {regions[player_id] for player_id, _ in seats}:
+                stats[(region_id, period, start)][0] += sign
+            for player_id, points in seats:
+                key = (regions[player_id], period, start)
+                stats[key][1] += sign
+                stats[key][2] += sign * points
+                activity[key + (player_id,)] += sign
+
+    upsert_increments(session, PlayerPeriodActivity, ('region_id', 'period', 'period_start', 'player_id'), [
+        {'region_id': r, 'period': p, 'period_start': s, 'player_id': player_id, 'games': count}
+        for (r, p, s, player_id), count in activity.items()
+    ])
+    upsert_increments(session, RegionPeriodStats, ('region_id', 'period', 'period_start'), [
+        {'region_id': r, 'period': p, 'period_start': s, 'games': g, 'participations': n, 'total_points': points,
+         'active_players': 0}
+        for (r, p, s), (g, n, points) in stats.items()
+    ])
+    if sign < 0:
+        session.execute(delete(PlayerPeriodActivity).where(
+            PlayerPeriodActivity.player_id.in_(player_ids), PlayerPeriodActivity.games <= 0))
+
+    # Active players are recounted from the activity rows of the touched periods only
+    active = select(func.count()).where(
+        PlayerPeriodActivity.region_id == RegionPeriodStats.region_id,
+        PlayerPeriodActivity.period == RegionPeriodStats.period,
+        PlayerPeriodActivity.period_start == RegionPeriodStats.period_start
+    ).scalar_subquery()
+    session.execute(
+        update(RegionPeriodStats.__table__)
+        .where(RegionPeriodStats.region_id == bindparam('r'), RegionPeriodStats.period == bindparam('p'),
+               RegionPeriodStats.period_start == bindparam('s'))
+        .values(active_players=active),
+        [{'r': r, 'p': p, 's': s} for r, p, s in stats]
+    )
+    if sign < 0:
+        session.execute(delete(RegionPeriodStats).where(
+            RegionPeriodStats.region_id.in_({r for r, _, _ in stats}), RegionPeriodStats.games <= 0))
+
+
+def rating_buckets(ratings):
+    """Counter of (region_id, bucket) over (region_id, mu) pairs"""
+    width = Config.RATING_HISTOGRAM_WIDTH
+    return Counter((region_id, math.floor(mu / width)) for region_id, mu in ratings)
+
+
+def current_ratings(session, player_ids):
+    """(region_id, mu) of the given players as stored"""
+    return session.execute(select(Player.region_id, Player.mu).where(Player.id.in_(player_ids))).tuples().all()
+
+
+def update_histogram(session, before, after):
+    """Move players between buckets given rating_buckets() before and after a write (caller commits)"""
+    changes = Counter(after)
+    changes.subtract(before)
+    rows = [{'region_id': r, 'bucket': b, 'players': n} for (r, b), n in changes.items() if n]
+    if not rows:
+        return
+    upsert_increments(session, RegionRatingBucket, ('region_id', 'bucket'), rows)
+    if any(row['players'] < 0 for row in rows):
+        session.execute(delete(RegionRatingBucket).where(RegionRatingBucket.players <= 0))
+
+
+def rebuild_histogram(session):
+    """Recount every bucket from the players table (caller commits)"""
+    session.execute(delete(RegionRatingBucket))
+    counts = rating_buckets(session.execute(select(Player.region_id, Player.mu)).tuples())
+    if counts:
+        session.execute(insert(RegionRatingBucket.__table__),
+                        [{'region_id': r, 'bucket': b, 'players': n} for (r, b), n in counts.items()])
+
+
+def rebuild_region_stats(session):
+    """Recompute every rollup with one INSERT ... SELECT per table and period (caller commits)"""
+    dialect = session.get_bind().dialect.name
+    session.execute(delete(PlayerPeriodActivity))
+    session.execute(delete(RegionPeriodStats))
+    for period in PERIODS:
+        start = period_start_sql(period, Game.played_at, dialect)
+        participations = (
+            select(Player.region_id, start.label('period_start'), GameParticipant.game_id,
+                   GameParticipant.player_id, GameParticipant.points)
+            .select_from(GameParticipant)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .join(Player, Player.id == GameParticipant.player_id)
+            .subquery()
+        )
+        session.execute(insert(PlayerPeriodActivity).from_select(
+            ['region_id', 'period', 'period_start', 'player_id', 'games'],
+            select(participations.c.region_id, literal(period), participations.c.period_start,
+                   participations.c.player_id, func.count())
+            .group_by(participations.c.region_id, participations.c.period_start, participations.c.player_id)
+        ))
+        session.execute(insert(RegionPeriodStats).from_select(
+            ['region_id', 'period', 'period_start', 'games', 'participations', 'total_points', 'active_players'],
+            select(participations.c.region_id, literal(period), participations.c.period_start,
+                   func.count(participations.c.game_id.distinct()), func.count(),
+                   func.sum(participations.c.points), func.count(participations.c.player_id.distinct()))
+            .group_by(participations.c.region_id, participations.c.period_start)
+        ))
+    rebuild_histogram(session)
+
+
+def region_stats(region_id, period='week', periods=12, since=None, until=None):
+    """
+    Time series and rating histogram of one region, read from the rollups.
+
+    Args:
+        period: 'day' or 'week'
+        periods: Most recent buckets to return (within since/until when given)
+    """
+    query = select(RegionPeriodStats).where(RegionPeriodStats.region_id == region_id,
+                                            RegionPeriodStats.period == period)
+    if since is not None:
+        query = query.where(RegionPeriodStats.period_start >= period_start(period, since))
+    if until is not None:
+        query = query.where(RegionPeriodStats.period_start <= until.date())
+    rows = db.session.scalars(query.order_by(RegionPeriodStats.period_start.desc()).limit(periods)).all()
+
+    width = Config.RATING_HISTOGRAM_WIDTH
+    buckets = db.session.execute(
+        select(RegionRatingBucket.bucket, RegionRatingBucket.players)
+        .where(RegionRatingBucket.region_id == region_id)
+        .order_by(RegionRatingBucket.bucket)
+    )
+    return {
+        'region_id': region_id,
+        'period': period,
+        'series': [row.to_dict() for row in reversed(rows)],
+        'histogram': {
+            'bucket_width': width,
+            'buckets': [{'min_rating': bucket * width, 'max_rating': (bucket + 1) * width, 'players': players}
+                        for bucket, players in buckets]
+        }
+    }
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        rebuild_region_stats(db.session)
+        db.session.commit()
+        print(f'{db.session.scalar(select(func.count()).select_from(RegionPeriodStats))} region periods, '
+              f'{db.session.scalar(select(func.count()).select_from(RegionRatingBucket))} rating buckets')
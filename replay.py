@@ -0,0 +1,563 @@
+"""
+Full rating recomputation from game history.
+
+Streams participations ordered by (played_at, game id) through a
+server-side cursor, re-runs RatingSystem.calculate_new_ratings against
+in-memory player states and writes back rewritten participant snapshots
+and player aggregates in batches. Memory is bounded by the number of
+players plus one write batch, not by the length of the history.
+
+Large histories can be replayed in parallel: the player-game graph is
+split into connected components and each group of components is replayed
+in its own process.
+
+Usage:
+    python replay.py [--dry-run] [--batch-size 5000] [--workers 4]
+"""
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from operator import attrgetter
+from sqlalchemy import select, update, insert, delete, func, or_, and_, bindparam
+from models import db, Player, PlayerState, Game, GameParticipant, apply_sqlite_pragmas
+from rating_system import rating_system
+from checkpoints import invalidate_checkpoints
+from head_to_head import pair_deltas, apply_deltas, rebuild_head_to_head
+from region_stats import record_region_games, rating_buckets, current_ratings, update_histogram, rebuild_histogram
+from serialization import bump_game_revisions
+from config import Config
+
+# Stored floats that differ by less than this are treated as unchanged
+TOLERANCE = 1e-9
+
+PARTICIPANT_COLUMNS = (
+    GameParticipant.id, GameParticipant.game_id, GameParticipant.player_id,
+    GameParticipant.placement, GameParticipant.points,
+    GameParticipant.mu_before, GameParticipant.sigma_before,
+    GameParticipant.mu_after, GameParticipant.sigma_after, Game.played_at
+)
+
+
+def history_order():
+    """Order in which games are rated"""
+    return (Game.played_at, Game.id)
+
+
+def stream_games(session, batch_size, where=None):
+    """Yield (game_id, [participant rows]) in rating order using a server-side cursor"""
+    stmt = select(*PARTICIPANT_COLUMNS)\
+        .join(Game, Game.id == GameParticipant.game_id)\
+        .order_by(*history_order(), GameParticipant.id)
+    if where is not None:
+        stmt = stmt.where(where)
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for game_id, rows in groupby(result, key=attrgetter('game_id')):
+        yield game_id, list(rows)
+
+
+def initial_states(session):
+    """Every player reset to the initial rating with zeroed counters"""
+    initial = rating_system.create_initial_rating()
+    return {
+        player_id: PlayerState(id=player_id, mu=initial.mu, sigma=initial.sigma)
+        for player_id in session.scalars(select(Player.id))
+    }
+
+
+def rate_game(rows, states):
+    """
+    Re-rate one game against `states` (mutated in place).
+
+    Returns:
+        List of (row, update dict) for participants whose snapshot changed
+    """
+    players = [states[row.player_id] for row in rows]
+    new_ratings = rating_system.calculate_new_ratings(
+        [(p.mu, p.sigma) for p in players], [row.placement for row in rows]
+    )
+    changed = []
+    for row, player, (mu_after, sigma_after) in zip(rows, players, new_ratings):
+        values = {
+            'id': row.id,
+            'mu_before': player.mu,
+            'sigma_before': player.sigma,
+            'mu_after': mu_after,
+            'sigma_after': sigma_after
+        }
+        if any(abs(values[k] - getattr(row, k)) > TOLERANCE for k in values if k != 'id'):
+            changed.append((row, values))
+        player.record_result(row.placement, row.points, mu_after, sigma_after)
+    return changed
+
+
+def player_diffs(session, states):
+    """Compare recomputed states with the stored players table"""
+    columns = [getattr(Player, column) for column in PlayerState.COLUMNS]
+    diffs = []
+    for row in session.execute(select(Player.name, *columns)):
+        state = states[row.id]
+        if any(abs(getattr(state, c) - (getattr(row, c) or 0)) > TOLERANCE for c in PlayerState.COLUMNS):
+            diffs.append({
+                'player_id': row.id,
+                'name': row.name,
+                'mu_before': row.mu,
+                'mu_after': state.mu,
+                'sigma_before': row.sigma,
+                'sigma_after': state.sigma,
+                'games_played_before': row.games_played,
+                'games_played_after': state.games_played
+            })
+    diffs.sort(key=lambda d: abs(d['mu_after'] - d['mu_before']), reverse=True)
+    return diffs
+
+
+def replay_history(dry_run=False, batch_size=None, progress=None, progress_every=10000):
+    """
+    Recompute every rating from the full game history.
+
+    Args:
+        dry_run: Compute and report differences without writing
+        batch_size: Rows fetched per cursor batch and updates per executemany
+        progress: Optional callable(games_done, total_games)
+        progress_every: Games between progress callbacks
+
+    Returns:
+        Summary dict with counts and the largest per-player changes
+    """
+    batch_size = batch_size or Config.REPLAY_BATCH_SIZE
+    session = db.session
+    started = time.perf_counter()
+    total_games = session.scalar(select(func.count(Game.id)))
+    states = initial_states(session)
+
+    games = participants_changed = 0
+    max_mu_change = 0.0
+    pending = []
+    for _, rows in stream_games(session, batch_size):
+        changed = rate_game(rows, states)
+        for row, values in changed:
+            max_mu_change = max(max_mu_change, abs(values['mu_after'] - row.mu_after))
+        participants_changed += len(changed)
+        if not dry_run:
+            pending.extend(values for _, values in changed)
+            if len(pending) >= batch_size:
+                session.execute(update(GameParticipant), pending)
+                pending = []
+        games += 1
+        if progress and games % progress_every == 0:
+            progress(games, total_games)
+
+    diffs = player_diffs(session, states)
+    if not dry_run:
+        check_complete(session, games, total_games)
+        if pending:
+            session.execute(update(GameParticipant), pending)
+        if diffs:
+            session.execute(update(Player), [states[d['player_id']].as_update() for d in diffs])
+            rebuild_histogram(session)
+        if participants_changed:
+            invalidate_checkpoints(session)
+            rebuild_head_to_head(session)
+            bump_game_revisions(session)
+        session.commit()
+    else:
+        session.rollback()
+    if progress:
+        progress(games, total_games)
+
+    return {
+        'dry_run': dry_run,
+        'games': games,
+        'participants_changed': participants_changed,
+        'players_changed': len(diffs),
+        'max_mu_change': max_mu_change,
+        'player_changes': diffs[:50],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def check_complete(session, games, total_games):
+    """Refuse to write a replay that did not see every game (rolls back and raises RuntimeError)"""
+    if games != total_games:
+        session.rollback()
+        raise RuntimeError(f'Replayed {games} of {total_games} games; nothing was written')
+
+
+def player_components(session, batch_size):
+    """
+    Union-find over the player-game graph.
+
+    Returns:
+        Dict of component root -> (player ids, participation count)
+    """
+    parent = {}
+
+    def find(player_id):
+        root = player_id
+        while parent[root] != root:
+            root = parent[root]
+        while parent[player_id] != root:
+            parent[player_id], player_id = root, parent[player_id]
+        return root
+
+    participations = {}
+    stmt = select(GameParticipant.game_id, GameParticipant.player_id).order_by(GameParticipant.game_id)
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for _, rows in groupby(result, key=attrgetter('game_id')):
+        roots = set()
+        for row in rows:
+            parent.setdefault(row.player_id, row.player_id)
+            participations[row.player_id] = participations.get(row.player_id, 0) + 1
+            roots.add(find(row.player_id))
+        first = roots.pop()
+        for root in roots:
+            parent[root] = first
+
+    components = {}
+    for player_id in parent:
+        players, count = components.get(find(player_id), ([], 0))
+        players.append(player_id)
+        components[find(player_id)] = (players, count + participations[player_id])
+    return components
+
+
+def partition_components(components, workers):
+    """Spread components over `workers` bins, largest first into the lightest bin"""
+    bins = [([], 0) for _ in range(workers)]
+    for players, count in sorted(components.values(), key=lambda c: c[1], reverse=True):
+        index = min(range(workers), key=lambda i: bins[i][1])
+        bins[index] = (bins[index][0] + players, bins[index][1] + count)
+    return [players for players, count in bins if players]
+
+
+def _replay_partition(database_url, player_ids, batch_size, output_path):
+    """
+    Worker process: replay the games of one set of closed components.
+
+    Changed participant snapshots are appended to `output_path` as packed
+    doubles (id, mu_before, sigma_before, mu_after, sigma_after) so the
+    parent can merge them without holding them all in memory.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    engine = create_engine(database_url)
+    apply_sqlite_pragmas(engine, Config.SQLITE_PRAGMAS)
+    initial = rating_system.create_initial_rating()
+    states = {player_id: PlayerState(id=player_id, mu=initial.mu, sigma=initial.sigma) for player_id in player_ids}
+    games = participants_changed = 0
+    max_mu_change = 0.0
+    buffer = array('d')
+
+    # Components are closed, so the partition's participant rows are exactly its games' rows;
+    # ids are rendered inline since a partition can exceed the driver's bound-parameter limit
+    own_rows = GameParticipant.player_id.in_(bindparam('player_ids', list(player_ids), expanding=True,
+                                                       literal_execute=True))
+    with Session(engine) as session, open(output_path, 'wb') as output:
+        for _, rows in stream_games(session, batch_size, own_rows):
+            for row, values in rate_game(rows, states):
+                max_mu_change = max(max_mu_change, abs(values['mu_after'] - row.mu_after))
+                buffer.extend((values['id'], values['mu_before'], values['sigma_before'],
+                               values['mu_after'], values['sigma_after']))
+                participants_changed += 1
+            games += 1
+            if len(buffer) >= batch_size * 5:
+                buffer.tofile(output)
+                buffer = array('d')
+        buffer.tofile(output)
+    engine.dispose()
+
+    return {
+        'games': games,
+        'participants_changed': participants_changed,
+        'max_mu_change': max_mu_change,
+        'states': {player_id: state.as_update() for player_id, state in states.items()}
+    }
+
+
+def replay_history_parallel(workers, dry_run=False, batch_size=None, progress=None):
+    """
+    Full replay split over independent player components.
+
+    Games only interact through shared players, so the player-game graph is
+    partitioned into connected components (games linking two groups merge
+    them) and each partition is replayed in its own process. The workers'
+    results are merged into one bulk write in the parent's transaction.
+
+    Same arguments and summary as replay_history, plus `workers`.
+    """
+    batch_size = batch_size or Config.REPLAY_BATCH_SIZE
+    session = db.session
+    started = time.perf_counter()
+    total_games = session.scalar(select(func.count(Game.id)))
+    components = player_components(session, batch_size)
+    partitions = partition_components(components, workers)
+    database_url = db.engine.url.render_as_string(hide_password=False)
+
+    states = initial_states(session)
+    games = participants_changed = 0
+    max_mu_change = 0.0
+    output_dir = tempfile.mkdtemp(prefix='replay-')
+    paths = [os.path.join(output_dir, f'partition-{i}.bin') for i in range(len(partitions))]
+    try:
+        with ProcessPoolExecutor(max_workers=max(min(workers, len(partitions)), 1)) as pool:
+            futures = [pool.submit(_replay_partition, database_url, players, batch_size, path)
+                       for players, path in zip(partitions, paths)]
+            for future in as_completed(futures):
+                result = future.result()
+                games += result['games']
+                participants_changed += result['participants_changed']
+                max_mu_change = max(max_mu_change, result['max_mu_change'])
+                for player_id, values in result['states'].items():
+                    states[player_id] = PlayerState(**values)
+                if progress:
+                    progress(games, total_games)
+
+        diffs = player_diffs(session, states)
+        if not dry_run:
+            check_complete(session, games, total_games)
+            for path in paths:
+                with open(path, 'rb') as f:
+                    while True:
+                        chunk = array('d')
+                        try:
+                            chunk.fromfile(f, batch_size * 5)
+                        except EOFError:
+                            pass
+                        if not chunk:
+                            break
+                        session.execute(update(GameParticipant), [
+                            {'id': int(chunk[i]), 'mu_before': chunk[i + 1], 'sigma_before': chunk[i + 2],
+                             'mu_after': chunk[i + 3], 'sigma_after': chunk[i + 4]}
+                            for i in range(0, len(chunk), 5)
+                        ])
+            if diffs:
+                session.execute(update(Player), [states[d['player_id']].as_update() for d in diffs])
+                rebuild_histogram(session)
+            if participants_changed:
+                invalidate_checkpoints(session)
+                rebuild_head_to_head(session)
+                bump_game_revisions(session)
+            session.commit()
+        else:
+            session.rollback()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return {
+        'dry_run': dry_run,
+        'games': games,
+        'components': len(components),
+        'workers': len(partitions),
+        'participants_changed': participants_changed,
+        'players_changed': len(diffs),
+        'max_mu_change': max_mu_change,
+        'player_changes': diffs[:50],
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def recompute_ratings(workers=1, **kwargs):
+    """Full replay, serial or component-parallel depending on `workers`"""
+    if workers and workers > 1:
+        return replay_history_parallel(workers, **kwargs)
+    return replay_history(**kwargs)
+
+
+def at_or_after(played_at, game_id):
+    """SQL condition selecting games at or after (played_at, game_id) in rating order"""
+    return or_(Game.played_at > played_at, and_(Game.played_at == played_at, Game.id >= game_id))
+
+
+def ratings_at(session, player_ids, played_at, game_id):
+    """
+    Each player's (mu, sigma) going into the history point (played_at, game_id).
+
+    That is the stored mu_before of their first game at or after the point,
+    or their current rating if they have not played since.
+    """
+    ratings = {}
+    for player_id in player_ids:
+        row = session.execute(
+            select(GameParticipant.mu_before, GameParticipant.sigma_before)
+            .join(Game, Game.id == GameParticipant.game_id)
+            .where(GameParticipant.player_id == player_id, at_or_after(played_at, game_id))
+            .order_by(*history_order())
+            .limit(1)
+        ).first()
+        if row is None:
+            row = session.execute(select(Player.mu, Player.sigma).where(Player.id == player_id)).first()
+        ratings[player_id] = (row[0], row[1])
+    return ratings
+
+
+def rewrite_game(game_id, results=None, played_at=None, batch_size=None):
+    """
+    Edit or delete a game and replay only the history it affects.
+
+    The replay starts at the earlier of the game's old and new position and
+    walks forward, re-rating only games that share a player with the
+    affected set (which grows as those games pull in more players). Games
+    and players outside that dependency cone are never written.
+
+    Args:
+        game_id: Game to change
+        results: New list of {'player_id', 'placement', 'points'}, or None to delete
+        played_at: New timestamp (defaults to the current one)
+
+    Returns:
+        Summary dict with the affected game and player ids
+    """
+    batch_size = batch_size or Config.REPLAY_BATCH_SIZE
+    session = db.session
+    started = time.perf_counter()
+    game = session.get(Game, game_id)
+    old_results = session.execute(
+        select(GameParticipant.player_id, GameParticipant.placement, GameParticipant.points,
+               (GameParticipant.mu_after - GameParticipant.mu_before).label('mu_change'))
+        .where(GameParticipant.game_id == game_id)
+    ).all()
+
+    old_key = (game.played_at, game.id)
+    new_key = (played_at or game.played_at, game.id)
+    start = min(old_key, new_key)
+    new_results = sorted(results or [], key=lambda r: r['placement'])
+
+    # Ratings of the directly affected players at the start of the cone
+    affected = {r.player_id for r in old_results} | {r['player_id'] for r in new_results}
+    ratings = ratings_at(session, affected, *start)
+
+    def rate(player_ids, placements):
+        new_ratings = rating_system.calculate_new_ratings([ratings[p] for p in player_ids], placements)
+        for player_id, rating in zip(player_ids, new_ratings):
+            ratings[player_id] = rating
+        return new_ratings
+
+    new_participants = []
+
+    def rate_edited_game():
+        player_ids = [r['player_id'] for r in new_results]
+        befores = [ratings[p] for p in player_ids]
+        afters = rate(player_ids, [r['placement'] for r in new_results])
+        for r, before, after in zip(new_results, befores, afters):
+            new_participants.append({
+                'game_id': game.id,
+                'player_id': r['player_id'],
+                'placement': r['placement'],
+                'points': r['points'],
+                'mu_before': before[0],
+                'sigma_before': before[1],
+                'mu_after': after[0],
+                'sigma_after': after[1]
+            })
+
+    # Head-to-head: take out every re-rated game's old contribution and add the new one
+    h2h = pair_deltas([[(r.player_id, r.placement, r.mu_change) for r in old_results]], -1)
+    affected_games = [game.id]
+    pending = []
+    edited_pending = bool(new_results)
+    for other_id, rows in stream_games(session, batch_size, where=at_or_after(*start)):
+        if other_id == game.id:
+            continue
+        if edited_pending and (rows[0].played_at, other_id) > new_key:
+            rate_edited_game()
+            edited_pending = False
+        player_ids = [row.player_id for row in rows]
+        if affected.isdisjoint(player_ids):
+            continue
+        # Players pulled into the cone start from their stored snapshot
+        for row in rows:
+            if row.player_id not in affected:
+                affected.add(row.player_id)
+                ratings[row.player_id] = (row.mu_before, row.sigma_before)
+        befores = [ratings[p] for p in player_ids]
+        afters = rate(player_ids, [row.placement for row in rows])
+        affected_games.append(other_id)
+        pair_deltas([[(row.player_id, row.placement, row.mu_after - row.mu_before) for row in rows]], -1, h2h)
+        pair_deltas([[(row.player_id, row.placement, after[0] - before[0])
+                      for row, before, after in zip(rows, befores, afters)]], 1, h2h)
+        for row, before, after in zip(rows, befores, afters):
+            pending.append({
+                'id': row.id,
+                'mu_before': before[0],
+                'sigma_before': before[1],
+                'mu_after': after[0],
+                'sigma_after': after[1]
+            })
+        if len(pending) >= batch_size:
+            session.execute(update(GameParticipant), pending)
+            pending = []
+    if edited_pending:
+        rate_edited_game()
+
+    if pending:
+        session.execute(update(GameParticipant), pending)
+    session.execute(delete(GameParticipant).where(GameParticipant.game_id == game.id))
+    if new_participants:
+        game.played_at = new_key[0]
+        game.num_players = len(new_participants)
+        session.execute(insert(GameParticipant), new_participants)
+        pair_deltas([[(r['player_id'], r['placement'], r['mu_after'] - r['mu_before']) for r in new_participants]], 1, h2h)
+    else:
+        session.delete(game)
+    apply_deltas(session, h2h)
+    record_region_games(session, [(old_key[0], [(r.player_id, r.points) for r in old_results])], -1)
+    record_region_games(session, [(new_key[0], [(r['player_id'], r['points']) for r in new_participants])])
+
+    # Ratings for the whole cone; counters only move for the edited game's players
+    columns = [getattr(Player, column) for column in PlayerState.COLUMNS]
+    states = {row.id: PlayerState.from_row(row)
+              for row in session.execute(select(*columns).where(Player.id.in_(affected)))}
+    for r in old_results:
+        states[r.player_id].remove_result(r.placement, r.points)
+    for r in new_participants:
+        states[r['player_id']].add_result(r['placement'], r['points'])
+    for player_id, (mu, sigma) in ratings.items():
+        states[player_id].mu = mu
+        states[player_id].sigma = sigma
+    histogram_before = rating_buckets(current_ratings(session, affected))
+    session.execute(update(Player), [state.as_update() for state in states.values()])
+    update_histogram(session, histogram_before, rating_buckets(current_ratings(session, affected)))
+    invalidate_checkpoints(session, *start)
+    bump_game_revisions(session, affected_games)
+    session.commit()
+
+    return {
+        'game_id': game_id,
+        'deleted': not new_participants,
+        'affected_games': affected_games,
+        'affected_players': sorted(affected),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app, publish_changes
+    from submission_queue import submission_queue
+
+    parser = argparse.ArgumentParser(description='Recompute all ratings from game history')
+    parser.add_argument('--dry-run', action='store_true', help='report differences without writing')
+    parser.add_argument('--batch-size', type=int, default=Config.REPLAY_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=Config.REPLAY_WORKERS,
+                        help='processes for a component-parallel replay (1 replays serially)')
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+
+    with app.app_context(), submission_queue.exclusive():
+        summary = recompute_ratings(
+            workers=args.workers, dry_run=args.dry_run, batch_size=args.batch_size,
+            progress=lambda done, total: print(f'{done}/{total} games replayed')
+        )
+        if not args.dry_run and (summary['participants_changed'] or summary['players_changed']):
+            publish_changes(rebuild=True)
+
+    for diff in summary['player_changes']:
+        print(f"{diff['name']}: {diff['mu_before']:.1f} -> {diff['mu_after']:.1f}")
+    print(f"{summary['participants_changed']} participations and {summary['players_changed']} players "
+          f"{'would change' if args.dry_run else 'updated'}")
@@ -1,10 +1,41 @@
-from app import app
-from models import db, Player, Game, GameParticipant, Region
-from rating_system import rating_system
 from datetime import datetime, timedelta
 import random
 
+
+def random_tables(players, num_games, rng=random):
+    """Draw `num_games` tables of 2-4 players (at most all of them) sampled from `players`"""
+    players = list(players)
+    sizes = [size for size in (2, 3, 4) if size <= len(players)]
+    return [rng.sample(players, rng.choice(sizes)) for _ in range(num_games)]
+
+
+def random_results(game_players, rng=random):
+    """Random points and placements for one table, tied points sharing a placement"""
+    num_players = len(game_players)
+    points = sorted([rng.randint(5, 15) for _ in range(num_players)], reverse=True)
+
+    results = []
+    for j, p in enumerate(game_players):
+        placement = 1
+        for k in range(j):
+            if points[j] < points[k]:
+                placement += 1
+
+        results.append({
+            "player": p,
+            "placement": placement,
+            "points": points[j]
+        })
+    return results
+
+
 def seed_test_data():
+    from app import app
+    from models import db, Player, Game, GameParticipant, Region
+    from rating_system import rating_system
+    from head_to_head import rebuild_head_to_head
+    from region_stats import rebuild_region_stats
+
     with app.app_context():
         print("Seeding test data with per-player regions...")
 
@@ -48,27 +79,7 @@ def seed_test_data():
             players[name] = player
 
         # 3. Simulate games (Cross-regional games possible)
-        scenarios = []
-        for i in range(30):
-            num_players = random.choice([2, 3, 4])
-            game_players = random.sample(list(players.values()), num_players)
-            
-            # Random points and placements
-            points = sorted([random.randint(5, 15) for _ in range(num_players)], reverse=True)
-            
-            results = []
-            for j, p in enumerate(game_players):
-                placement = 1
-                for k in range(j):
-                    if points[j] < points[k]:
-                        placement += 1
-                
-                results.append({
-                    "player": p,
-                    "placement": placement,
-                    "points": points[j]
-                })
-            scenarios.append(results)
+        scenarios = [random_results(game_players) for game_players in random_tables(players.values(), 30)]
 
         # 4. Process scenarios
         for idx, scenario_results in enumerate(scenarios):
@@ -97,15 +108,10 @@ def seed_test_data():
                 db.session.add(participant)
 
                 # Update Global Player Stats
-                player.mu = res['mu_after']
-                player.sigma = res['sigma_after']
-                player.games_played += 1
-                player.total_points += res['points']
-                if res['placement'] == 1: player.first_place += 1
-                elif res['placement'] == 2: player.second_place += 1
-                elif res['placement'] == 3: player.third_place += 1
-                elif res['placement'] == 4: player.fourth_place += 1
+                player.record_result(res['placement'], res['points'], res['mu_after'], res['sigma_after'])
 
+        rebuild_head_to_head(db.session)
+        rebuild_region_stats(db.session)
         db.session.commit()
         print("Successfully seeded database with per-player regional data!")
 
@@ -0,0 +1,207 @@
+"""
+Fast JSON for the large read payloads.
+
+Row builders turn SQL result tuples straight into the dicts the models'
+to_dict() methods produce, so leaderboards and game lists skip ORM
+hydration. encode() emits exactly the bytes jsonify would (sorted keys,
+compact separators, ASCII only), through orjson when it is installed and
+the stdlib otherwise. Games only change when an admin edits one or a
+replay rewrites history, and both bump the game's revision, so encoded
+bytes are cached by game id and revision and survive unrelated writes.
+"""
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select, func, literal, true
+from models import db, Region, Player, Game, GameParticipant, GameRevision, UPSERTS, upsert_increments
+from instrumentation import timed
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PLAYER_COLUMNS = (
+    Player.id, Player.name, Player.region_id, Region.name.label('region_name'), Player.mu, Player.sigma,
+    Player.games_played, Player.first_place, Player.second_place, Player.third_place, Player.fourth_place,
+    Player.total_points, Player.created_at
+)
+
+GAME_COLUMNS = (
+    Game.id, Game.played_at, Game.num_players, GameParticipant.id.label('participant_id'),
+    GameParticipant.player_id, Player.name.label('player_name'), GameParticipant.placement,
+    GameParticipant.points, GameParticipant.mu_before, GameParticipant.mu_after
+)
+
+
+def select_players(*columns):
+    """SELECT of the Player.to_dict columns (plus `columns`) with the region name joined"""
+    return select(*PLAYER_COLUMNS, *columns).outerjoin(Region, Region.id == Player.region_id)
+
+
+def player_row(row):
+    """Player.to_dict() from a select_players() row"""
+    (player_id, name, region_id, region_name, mu, sigma, games_played, first_place, second_place,
+     third_place, fourth_place, total_points, created_at) = row[:13]
+    return {
+        'id': player_id,
+        'name': name,
+        'region_id': region_id,
+        'region_name': region_name if region_name is not None else "Unknown",
+        'rating': int(round(mu)),
+        'mu': int(round(mu)),
+        'sigma': int(round(sigma)),
+        'games_played': games_played,
+        'first_place': first_place,
+        'second_place': second_place,
+        'third_place': third_place,
+        'fourth_place': fourth_place,
+        'total_points': total_points,
+        'average_points': round(total_points / games_played, 2) if games_played > 0 else 0,
+        'win_rate': round((first_place / games_played) * 100, 1) if games_played > 0 else 0,
+        'created_at': created_at.isoformat()
+    }
+
+
+def select_game_keys():
+    """SELECT of (game id, revision) pairs for games_json()"""
+    return select(Game.id, func.coalesce(GameRevision.revision, 0).label('revision'))\
+        .outerjoin(GameRevision, GameRevision.game_id == Game.id)
+
+
+def bump_game_revisions(session, game_ids=None):
+    """Mark `game_ids` (every game when None) as rewritten so cached encodings are skipped (caller commits)"""
+    if game_ids is not None:
+        if game_ids:
+            upsert_increments(session, GameRevision, ('game_id',),
+                              [{'game_id': game_id, 'revision': 1} for game_id in set(game_ids)])
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect not in UPSERTS:
+        raise ValueError(f'Incremental upserts are not supported on {dialect}')
+    # WHERE true keeps SQLite from parsing ON CONFLICT as part of the SELECT
+    stmt = UPSERTS[dialect](GameRevision).from_select(['game_id', 'revision'],
+                                                      select(Game.id, literal(1)).where(true()))
+    session.execute(stmt.on_conflict_do_update(index_elements=[GameRevision.game_id],
+                                               set_={'revision': GameRevision.revision + 1}))
+
+
+def load_games(game_ids):
+    """Game.to_dict() for each id, keyed by id (missing games are left out)"""
+    games = {}
+    rows = db.session.execute(
+        select(*GAME_COLUMNS)
+        .outerjoin(GameParticipant, GameParticipant.game_id == Game.id)
+        .outerjoin(Player, Player.id == GameParticipant.player_id)
+        .where(Game.id.in_(game_ids))
+        .order_by(Game.id, GameParticipant.placement, GameParticipant.id)
+    )
+    for (game_id, played_at, num_players, participant_id, player_id, player_name, placement, points,
+         mu_before, mu_after) in rows:
+        game = games.get(game_id)
+        if game is None:
+            game = games[game_id] = {'id': game_id, 'played_at': played_at.isoformat(),
+                                     'num_players': num_players, 'participants': []}
+        if participant_id is not None:
+            game['participants'].append({
+                'id': participant_id,
+                'player_id': player_id,
+                'player_name': player_name,
+                'placement': placement,
+                'points': points,
+                'rating_change': int(round(mu_after)) - int(round(mu_before)),
+                'mu_before': int(round(mu_before)),
+                'mu_after': int(round(mu_after))
+            })
+    return games
+
+
+def is_compact():
+    """Whether jsonify would currently emit compact output"""
+    provider = current_app.json
+    return provider.compact or (provider.compact is None and not current_app.debug)
+
+
+@timed('serialize')
+def encode(obj):
+    """
+    Bytes identical to a jsonify() body, trailing newline included.
+
+    The orjson path is meant for row-builder payloads: ints, strings, None
+    and floats rounded to a few decimals, which both encoders print alike.
+    Anything else it cannot reproduce byte for byte goes to the stdlib.
+    """
+    provider = current_app.json
+    if not is_compact():
+        return (json.dumps(obj, default=provider.default, ensure_ascii=provider.ensure_ascii,
+                           sort_keys=provider.sort_keys, indent=2) + '\n').encode()
+    if orjson is not None and provider.ensure_ascii:
+        try:
+            body = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if provider.sort_keys else 0)
+        except TypeError:
+            body = None
+        # The stdlib escapes everything past '~'; orjson writes it as UTF-8
+        if body is not None and body.isascii() and b'\x7f' not in body:
+            return body + b'\n'
+    return (json.dumps(obj, default=provider.default, ensure_ascii=provider.ensure_ascii,
+                       sort_keys=provider.sort_keys, separators=(',', ':')) + '\n').encode()
+
+
+class EncodedGameCache:
+    """
+    Bounded LRU of encoded Game.to_dict() payloads, each tagged with the
+    game's revision.
+
+    An entry is only served for the revision it was encoded at, so writes
+    that do not rewrite a game (new games, other workers' submissions)
+    leave it cached; a rewritten game misses under its new revision.
+    """
+
+    def __init__(self, max_games=4096):
+        self.max_games = max_games
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Encoded games (no trailing newline) for (game id, revision) pairs, in order"""
+        found = {}
+        with self._lock:
+            for game_id, revision in keys:
+                entry = self._entries.get(game_id)
+                if entry is not None and entry[0] == revision:
+                    self._entries.move_to_end(game_id)
+                    found[game_id] = entry[1]
+
+        revisions = dict(keys)
+        missing = [game_id for game_id, _ in keys if game_id not in found]
+        if missing:
+            loaded = {game_id: encode(game)[:-1] for game_id, game in load_games(missing).items()}
+            found.update(loaded)
+            with self._lock:
+                for game_id, body in loaded.items():
+                    self._entries[game_id] = (revisions[game_id], body)
+                    self._entries.move_to_end(game_id)
+                while len(self._entries) > self.max_games:
+                    self._entries.popitem(last=False)
+        return [found[game_id] for game_id, _ in keys if game_id in found]
+
+    def discard(self, game_ids):
+        """Free the superseded entries of games a local write rewrote"""
+        with self._lock:
+            for game_id in game_ids:
+                self._entries.pop(game_id, None)
+
+
+def games_json(keys):
+    """Encoded list of the games given as select_game_keys() rows, served from the cache when compact"""
+    keys = [(game_id, revision) for game_id, revision in keys]
+    if not is_compact():
+        games = load_games([game_id for game_id, _ in keys])
+        return encode([games[game_id] for game_id, _ in keys if game_id in games])
+    return b'[' + b','.join(game_cache.get_many(keys)) + b']\n'
+
+
+# Global encoded game cache instance
+game_cache = EncodedGameCache(max_games=Config.GAME_CACHE_SIZE)
@@ -0,0 +1,297 @@
+"""
+Monte Carlo season simulator.
+
+Each simulated season draws every player's true skill from their current
+rating (Normal(mu, sigma)), plays a number of rounds whose tables come from
+a pluggable scenario source, samples each table's finishing order from
+skill plus per-game performance noise (the model's beta), and applies the
+usual Plackett-Luce updates. Seasons are independent, so many of them are
+stacked into (seasons x players) arrays and every table of a round is rated
+with one `rate_many` call; the seasons themselves are split across a
+process pool. Each worker gets its own child of one SeedSequence, so a run
+is reproducible for a given seed and worker count. Workers only return
+summed counters, never per-season data.
+
+Usage:
+    python simulator.py --rounds 6 --seasons 100000 --region-id 2 --top 3 --workers 4 --seed 42
+"""
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sqlalchemy import select
+from models import db, Player
+from rating_system import rating_system, independent_runs
+from matchmaking import table_sizes
+from seed_test_data import random_tables
+from config import Config
+
+
+class SwissScenario:
+    """Every round seats all players by current rating, 4-player tables first"""
+
+    def __init__(self, num_players):
+        self.sizes = table_sizes(num_players)
+        if self.sizes is None:
+            raise ValueError(f'{num_players} players cannot be split into 3-4 player tables')
+
+    def round(self, rng, mu):
+        order = np.argsort(-mu, axis=1, kind='stable')
+        fours = self.sizes.count(4) * 4
+        blocks = [order[:, :fours].reshape(len(mu), -1, 4), order[:, fours:].reshape(len(mu), -1, 3)]
+        return [[block for block in blocks if block.shape[1]]]
+
+
+class RandomScenario:
+    """seed_test_data's generator: `games_per_round` random 2-4 player tables, players may repeat"""
+
+    def __init__(self, num_players, games_per_round=None):
+        if num_players < 2:
+            raise ValueError('The random scenario needs at least 2 players')
+        self.num_players = num_players
+        self.games_per_round = games_per_round or max(num_players // 3, 1)
+
+    def round(self, rng, mu):
+        # One draw of tables shared by the whole batch of seasons; outcomes still differ per season
+        tables = random_tables(range(self.num_players), self.games_per_round,
+                               random.Random(int(rng.integers(2 ** 63))))
+        waves = []
+        for run in independent_runs([[{'player': p} for p in table] for table in tables]):
+            by_size = {}
+            for game in run:
+                by_size.setdefault(len(game), []).append([r['player'] for r in game])
+            waves.append([np.broadcast_to(np.array(block), (len(mu), len(block), size))
+                          for size, block in sorted(by_size.items())])
+        return waves
+
+
+SCENARIOS = {
+    'swiss': SwissScenario,
+    'random': RandomScenario,
+}
+
+
+def make_scenario(name, num_players, **options):
+    if name not in SCENARIOS:
+        raise ValueError(f'Unknown scenario: {name}')
+    return SCENARIOS[name](num_players, **options)
+
+
+def simulate_seasons(pool, seasons, rounds, scenario, top, seed_sequence, new_players=0,
+                     sigma_threshold=None, batch_size=None):
+    """
+    Simulate `seasons` seasons for one worker and return summed counters.
+
+    Args:
+        pool: Dict of 'mu' and 'sigma' arrays for the real players
+        seasons: Number of seasons to run
+        rounds: Rounds per season
+        scenario: Tuple of (scenario name, options dict)
+        top: Finishing positions counted as "top"
+        seed_sequence: numpy SeedSequence for this worker
+        new_players: Fresh players (initial rating) appended to the pool
+        sigma_threshold: Sigma below which a new player counts as converged
+        batch_size: Seasons stacked into one set of arrays
+
+    Returns:
+        Dict of aggregate arrays (see `simulate`)
+    """
+    rng = np.random.default_rng(seed_sequence)
+    sigma_threshold = sigma_threshold if sigma_threshold is not None else Config.SIMULATION_SIGMA_THRESHOLD
+    batch_size = batch_size or Config.SIMULATION_BATCH_SIZE
+    beta = rating_system.model.beta
+
+    base_mu = np.concatenate((pool['mu'], np.full(new_players, Config.OPENSKILL_MU)))
+    base_sigma = np.concatenate((pool['sigma'], np.full(new_players, Config.OPENSKILL_SIGMA)))
+    num_players = len(base_mu)
+    name, options = scenario
+    source = make_scenario(name, num_players, **options)
+
+    totals = {
+        'first': np.zeros(num_players, dtype=np.int64),
+        'top': np.zeros(num_players, dtype=np.int64),
+        'rank_sum': np.zeros(num_players),
+        'mu_sum': np.zeros(num_players),
+        'games_sum': np.zeros(num_players),
+        # converged[g] = new players whose sigma first dropped below the threshold after g games
+        'converged': np.zeros(1, dtype=np.int64),
+        'unconverged': 0,
+    }
+
+    done = 0
+    while done < seasons:
+        batch = min(batch_size, seasons - done)
+        mu = np.tile(base_mu, (batch, 1))
+        sigma = np.tile(base_sigma, (batch, 1))
+        skill = rng.normal(mu, sigma)
+        games = np.zeros((batch, num_players), dtype=np.int64)
+        converged_at = np.full((batch, new_players), -1, dtype=np.int64)
+        seasons_index = np.arange(batch)[:, None, None]
+
+        for _ in range(rounds):
+            for wave in source.round(rng, mu):
+                for tables in wave:
+                    size = tables.shape[2]
+                    performance = skill[seasons_index, tables] + beta * rng.standard_normal(tables.shape)
+                    ranks = np.argsort(np.argsort(-performance, axis=2), axis=2) + 1
+                    new_mu, new_sigma = rating_system.rate_many(
+                        mu[seasons_index, tables].ravel(), sigma[seasons_index, tables].ravel(),
+                        ranks.ravel(), np.full(tables.shape[0] * tables.shape[1], size)
+                    )
+                    mu[seasons_index, tables] = new_mu.reshape(tables.shape)
+                    sigma[seasons_index, tables] = new_sigma.reshape(tables.shape)
+                    games[seasons_index, tables] += 1
+                if new_players:
+                    newly = (converged_at < 0) & (sigma[:, -new_players:] < sigma_threshold)
+                    converged_at[newly] = games[:, -new_players:][newly]
+
+        final_rank = np.argsort(np.argsort(-mu, axis=1, kind='stable'), axis=1) + 1
+        totals['first'] += (final_rank == 1).sum(axis=0)
+        totals['top'] += (final_rank <= top).sum(axis=0)
+        totals['rank_sum'] += final_rank.sum(axis=0)
+        totals['mu_sum'] += mu.sum(axis=0)
+        totals['games_sum'] += games.sum(axis=0)
+        if new_players:
+            reached = converged_at[converged_at >= 0]
+            counts = np.bincount(reached, minlength=len(totals['converged']))
+            counts[:len(totals['converged'])] += totals['converged']
+            totals['converged'] = counts
+            totals['unconverged'] += int((converged_at < 0).sum())
+        done += batch
+
+    return totals
+
+
+def _percentile(histogram, fraction):
+    """Smallest game count reached by `fraction` of all new players, None if never"""
+    total = histogram['count']
+    cumulative = np.cumsum(histogram['converged'])
+    index = np.searchsorted(cumulative, fraction * total) if total else len(cumulative)
+    return int(index) if index < len(cumulative) else None
+
+
+def simulate(player_ids=None, region_id=None, rounds=6, seasons=None, scenario='swiss',
+             scenario_options=None, top=3, new_players=0, sigma_threshold=None,
+             workers=None, seed=None):
+    """
+    Forecast standings over `rounds` more rounds for a pool of players.
+
+    The pool is `player_ids`, else every player of `region_id`, else
+    everyone. Standings are ranked by mu within the pool.
+
+    Returns:
+        Summary dict with per-player odds, or raises ValueError
+    """
+    started = time.perf_counter()
+    seasons = seasons or Config.SIMULATION_SEASONS
+    workers = max(1, min(workers or Config.SIMULATION_WORKERS, seasons))
+
+    stmt = select(Player.id, Player.name, Player.mu, Player.sigma).order_by(Player.id)
+    if player_ids:
+        stmt = stmt.where(Player.id.in_(player_ids))
+    elif region_id is not None:
+        stmt = stmt.where(Player.region_id == region_id)
+    rows = db.session.execute(stmt).all()
+    if player_ids:
+        missing = set(player_ids) - {row.id for row in rows}
+        if missing:
+            raise LookupError(f'Player {min(missing)} not found')
+    pool = {'mu': np.array([row.mu for row in rows], dtype=float),
+            'sigma': np.array([row.sigma for row in rows], dtype=float)}
+    # Fail fast on an impossible pool before starting any workers
+    make_scenario(scenario, len(rows) + new_players, **(scenario_options or {}))
+
+    shares = [seasons // workers + (i < seasons % workers) for i in range(workers)]
+    children = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [(pool, share, rounds, (scenario, scenario_options or {}), top, child, new_players, sigma_threshold)
+            for share, child in zip(shares, children)]
+    if workers == 1:
+        results = [simulate_seasons(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(simulate_seasons, *zip(*jobs)))
+
+    totals = results[0]
+    for result in results[1:]:
+        for key in ('first', 'top', 'rank_sum', 'mu_sum', 'games_sum'):
+            totals[key] += result[key]
+        size = max(len(totals['converged']), len(result['converged']))
+        totals['converged'] = (np.pad(totals['converged'], (0, size - len(totals['converged'])))
+                               + np.pad(result['converged'], (0, size - len(result['converged']))))
+        totals['unconverged'] += result['unconverged']
+
+    players = []
+    for i, row in enumerate(rows):
+        players.append({
+            'id': row.id,
+            'name': row.name,
+            'rating': int(round(row.mu)),
+            'win_probability': totals['first'][i] / seasons,
+            'top_probability': totals['top'][i] / seasons,
+            'expected_rank': totals['rank_sum'][i] / seasons,
+            'expected_rating': int(round(totals['mu_sum'][i] / seasons)),
+            'expected_games': totals['games_sum'][i] / seasons
+        })
+    players.sort(key=lambda p: (-p['top_probability'], p['expected_rank'], p['id']))
+
+    summary = {
+        'scenario': scenario,
+        'seasons': seasons,
+        'rounds': rounds,
+        'top': top,
+        'seed': seed,
+        'workers': workers,
+        'players': players
+    }
+    if new_players:
+        histogram = {'converged': totals['converged'],
+                     'count': int(totals['converged'].sum()) + totals['unconverged']}
+        reached = totals['converged']
+        summary['new_players'] = {
+            'count': new_players,
+            'sigma_threshold': sigma_threshold if sigma_threshold is not None else Config.SIMULATION_SIGMA_THRESHOLD,
+            'converged_fraction': reached.sum() / histogram['count'],
+            'mean_games_to_converge': (float(np.arange(len(reached)) @ reached / reached.sum())
+                                       if reached.sum() else None),
+            'median_games_to_converge': _percentile(histogram, 0.5),
+            'p90_games_to_converge': _percentile(histogram, 0.9),
+            'top_probability': totals['top'][len(rows):].sum() / (seasons * new_players)
+        }
+    summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return summary
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Monte Carlo forecast of standings over the next rounds')
+    parser.add_argument('--rounds', type=int, default=6)
+    parser.add_argument('--seasons', type=int, default=Config.SIMULATION_SEASONS)
+    parser.add_argument('--region-id', type=int)
+    parser.add_argument('--player', type=int, action='append', dest='player_ids', help='restrict the pool (repeatable)')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='swiss')
+    parser.add_argument('--games-per-round', type=int, help='tables per round for the random scenario')
+    parser.add_argument('--top', type=int, default=3)
+    parser.add_argument('--new-players', type=int, default=0, help='fresh players added to track sigma convergence')
+    parser.add_argument('--sigma-threshold', type=float)
+    parser.add_argument('--workers', type=int, default=Config.SIMULATION_WORKERS)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--limit', type=int, default=20, help='players to print')
+    args = parser.parse_args()
+
+    options = {'games_per_round': args.games_per_round} if args.scenario == 'random' else {}
+    with app.app_context():
+        summary = simulate(
+            player_ids=args.player_ids, region_id=args.region_id, rounds=args.rounds, seasons=args.seasons,
+            scenario=args.scenario, scenario_options=options, top=args.top, new_players=args.new_players,
+            sigma_threshold=args.sigma_threshold, workers=args.workers, seed=args.seed
+        )
+    print(f"{summary['seasons']} seasons x {summary['rounds']} rounds in {summary['elapsed_ms']} ms")
+    for p in summary['players'][:args.limit]:
+        print(f"{p['name']:<24} win {p['win_probability']:6.1%}  top-{args.top} {p['top_probability']:6.1%}"
+              f"  expected rank {p['expected_rank']:.2f}")
+    if 'new_players' in summary:
+        stats = summary['new_players']
+        print(f"New players: {stats['converged_fraction']:.1%} below sigma {stats['sigma_threshold']},"
+              f" median {stats['median_games_to_converge']} games, p90 {stats['p90_games_to_converge']}")
@@ -280,6 +280,9 @@ function updatePlayerInputs() {
     }
 }
 
+// Idempotency key of the game submission in flight
+let pendingGameKey = null;
+
 // Handle submit game
 async function handleSubmitGame(event) {
     event.preventDefault();
@@ -314,14 +317,29 @@ async function handleSubmitGame(event) {
         });
     }
 
+    // Reused until the server answers, so resubmitting after a network error cannot add the game twice
+    if (!pendingGameKey) {
+        pendingGameKey = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
     try {
-        const response = await fetch(`${API_BASE}/api/admin/games`, {
+        let response = await fetch(`${API_BASE}/api/admin/games`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ results })
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': pendingGameKey },
+            body: JSON.stringify({ results, wait: 5 })
         });
-
-        const data = await response.json();
+        let data = await response.json();
+        pendingGameKey = null;
+
+        // Still queued after the wait: poll the ticket until the writer gets to it
+        while (response.status === 202) {
+            alertDiv.innerHTML = '<div class="alert alert-success">Game queued, waiting for ratings...</div>';
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            response = await fetch(`${API_BASE}/api/admin/games/status/${data.ticket}`);
+            data = await response.json();
+        }
 
         if (response.ok) {
             alertDiv.innerHTML = '<div class="alert alert-success">Game submitted successfully! Ratings updated.</div>';
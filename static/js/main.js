@@ -1,6 +1,14 @@
 // API Base URL
 const API_BASE = '';
 
+// Rows currently shown, in rank order
+let leaderboardRows = [];
+let leaderboardStream = null;
+let streamRegion = null;
+let pollTimer = null;
+
+const POLL_INTERVAL_MS = 30000;
+
 // Load initial data
 document.addEventListener('DOMContentLoaded', () => {
     loadRegions();
@@ -25,45 +33,120 @@ async function loadRegions() {
     }
 }
 
-// Load leaderboard data
-async function loadLeaderboard() {
+// Load leaderboard data (quietly, without the spinner, for live refreshes)
+async function loadLeaderboard(quiet = false) {
     const loading = document.getElementById('loading');
     const container = document.getElementById('leaderboard-container');
     const noPlayers = document.getElementById('no-players');
-    const tbody = document.getElementById('leaderboard-body');
     const regionId = document.getElementById('region-filter').value;
 
-    loading.classList.remove('hidden');
-    container.classList.add('hidden');
-    noPlayers.classList.add('hidden');
+    if (!quiet) {
+        loading.classList.remove('hidden');
+        container.classList.add('hidden');
+        noPlayers.classList.add('hidden');
+    }
 
     try {
         const url = regionId ? `${API_BASE}/api/leaderboard?region_id=${regionId}` : `${API_BASE}/api/leaderboard`;
         const response = await fetch(url);
-        const data = await response.json();
+        leaderboardRows = await response.json();
 
         loading.classList.add('hidden');
+        renderLeaderboard();
+        connectLeaderboardStream(regionId);
+    } catch (error) {
+        console.error('Error loading leaderboard:', error);
+        loading.classList.add('hidden');
+        if (!quiet) {
+            showAlert('error', 'Failed to load leaderboard');
+        }
+    }
+}
+
+function renderLeaderboard() {
+    const container = document.getElementById('leaderboard-container');
+    const noPlayers = document.getElementById('no-players');
+    const tbody = document.getElementById('leaderboard-body');
+    const regionId = document.getElementById('region-filter').value;
+
+    if (leaderboardRows.length === 0) {
+        container.classList.add('hidden');
+        noPlayers.innerHTML = `<p class="text-muted">${regionId ? 'No rankings for this region yet.' : 'No players yet.'}</p>`;
+        noPlayers.classList.remove('hidden');
+        return;
+    }
 
-        if (data.length === 0) {
-            noPlayers.innerHTML = `<p class="text-muted">${regionId ? 'No rankings for this region yet.' : 'No players yet.'}</p>`;
-            noPlayers.classList.remove('hidden');
-            return;
+    noPlayers.classList.add('hidden');
+    tbody.innerHTML = '';
+    leaderboardRows.forEach(player => {
+        const row = createLeaderboardRow(player);
+        tbody.appendChild(row);
+    });
+
+    container.classList.remove('hidden');
+}
+
+// Follow live rank changes over Server-Sent Events, polling when that is unavailable
+function connectLeaderboardStream(regionId) {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    if (leaderboardStream && streamRegion === regionId) {
+        return;
+    }
+    if (leaderboardStream) {
+        leaderboardStream.close();
+    }
+
+    streamRegion = regionId;
+    const url = regionId ? `${API_BASE}/api/stream/leaderboard?region_id=${regionId}` : `${API_BASE}/api/stream/leaderboard`;
+    const stream = new EventSource(url);
+    let reconnecting = false;
+    leaderboardStream = stream;
+
+    stream.addEventListener('ranks', event => applyRankChanges(JSON.parse(event.data).players));
+    stream.addEventListener('reset', () => loadLeaderboard(true));
+    stream.onopen = () => {
+        stopPolling();
+        // Updates may have been missed while disconnected
+        if (reconnecting) {
+            loadLeaderboard(true);
         }
+        reconnecting = false;
+    };
+    stream.onerror = () => {
+        reconnecting = true;
+        if (stream.readyState === EventSource.CLOSED) {
+            // The server refused the stream (e.g. too many clients): poll instead
+            leaderboardStream = null;
+            startPolling();
+        }
+    };
+}
 
-        tbody.innerHTML = '';
-        data.forEach(player => {
-            const row = createLeaderboardRow(player);
-            tbody.appendChild(row);
-        });
+// Move changed players to their new ranks; everyone else keeps their relative order
+function applyRankChanges(players) {
+    const changed = new Set(players.map(p => p.id));
+    leaderboardRows = leaderboardRows.filter(p => !changed.has(p.id));
+    players.slice()
+        .sort((a, b) => a.rank - b.rank)
+        .forEach(p => leaderboardRows.splice(p.rank - 1, 0, p));
+    leaderboardRows.forEach((p, i) => p.rank = i + 1);
+    renderLeaderboard();
+}
 
-        container.classList.remove('hidden');
-    } catch (error) {
-        console.error('Error loading leaderboard:', error);
-        loading.classList.add('hidden');
-        showAlert('error', 'Failed to load leaderboard');
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(() => loadLeaderboard(true), POLL_INTERVAL_MS);
     }
 }
 
+function stopPolling() {
+    clearInterval(pollTimer);
+    pollTimer = null;
+}
+
 // Create leaderboard table row
 function createLeaderboardRow(player) {
     const tr = document.createElement('tr');
@@ -0,0 +1,272 @@
+"""
+Queued game submission with a single writer.
+
+Submissions are appended to the `game_submissions` table and acknowledged
+with a ticket (the row id). One background thread per host - whichever
+process holds the writer lock file - applies them in arrival order:
+consecutive queued games are rated together with `process_many` and
+committed in one transaction along with their tickets' status, so a crash
+never applies a game twice and anything still queued is picked up on
+restart. Because only that thread reads and writes ratings for new games,
+two submissions sharing a player can no longer both start from the same mu.
+Edits, deletes, imports and replays rewrite ratings outside the queue, so
+they run inside `exclusive()`, which holds the writer off between batches.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, Player, Game, GameParticipant, GameSubmission
+from checkpoints import checkpoint_due, write_checkpoint
+from head_to_head import pair_deltas, apply_deltas
+from region_stats import record_region_games, rating_buckets, update_histogram
+from rating_system import rating_system
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process election, every process writes
+    fcntl = None
+
+
+class SubmissionQueue:
+    """Durable submission queue drained by one writer thread"""
+
+    def __init__(self, batch_size=200, poll_interval=0.2):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.app = None
+        self.publish = None
+        self.lock_path = None
+        self._lock_file = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._batch_lock = threading.RLock()
+        self._batch_depth = 0
+        self._wake = threading.Event()
+        self._applied = threading.Condition()
+
+    def init_app(self, app, publish):
+        """`publish(updated=players)` is called after every committed batch"""
+        self.app = app
+        self.publish = publish
+        self.lock_path = app.config.get('SUBMISSION_LOCK_PATH') or os.path.join(
+            tempfile.gettempdir(),
+            'splendor-writer-%s.lock' % hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+        )
+        # Submissions left queued by a previous process are applied once this one serves a request
+        app.before_request(self.start)
+
+    def enqueue(self, results, idempotency_key=None):
+        """
+        Append one game to the queue.
+
+        Returns:
+            Tuple of (GameSubmission, created); a repeated idempotency key
+            returns the original submission with created=False
+        """
+        submission = GameSubmission(idempotency_key=idempotency_key, payload=json.dumps({'results': results}))
+        db.session.add(submission)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = db.session.scalar(
+                select(GameSubmission).where(GameSubmission.idempotency_key == idempotency_key)
+            )
+            if existing is None:
+                raise
+            return existing, False
+        self.notify()
+        return submission, True
+
+    def status(self, ticket):
+        """Current state of a submission, read outside any stale transaction"""
+        db.session.rollback()
+        return db.session.get(GameSubmission, ticket, populate_existing=True)
+
+    def wait(self, ticket, timeout):
+        """Block until the submission leaves the queue or `timeout` seconds pass"""
+        self.notify()
+        deadline = time.monotonic() + timeout
+        while True:
+            submission = self.status(ticket)
+            remaining = deadline - time.monotonic()
+            if submission is None or submission.status != 'queued' or remaining <= 0:
+                return submission
+            # Woken by a local batch; other processes' batches are seen on the next poll
+            with self._applied:
+                self._applied.wait(min(remaining, self.poll_interval))
+
+    def notify(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='submission-writer', daemon=True)
+                self._thread.start()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Keep the writer (of any process on this host) from applying a batch
+        inside the block, for rating writes that bypass the queue.
+        """
+        with self._batch_lock:
+            self._batch_depth += 1
+            lock_file = None
+            try:
+                if self._batch_depth == 1 and fcntl is not None:
+                    lock_file = open(self.lock_path + '.batch', 'a')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                self._batch_depth -= 1
+                if lock_file is not None:
+                    lock_file.close()
+
+    def _is_writer(self):
+        """Hold the host-wide writer lock, taking it over once a previous holder exits"""
+        if fcntl is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._is_writer():
+                    with self.app.app_context():
+                        self._drain()
+            except Exception:
+                self.app.logger.exception('Submission writer failed')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _drain(self):
+        """Apply batches until the queue is empty, letting exclusive() writers in between them"""
+        while True:
+            with self.exclusive():
+                # Fresh transaction, so ratings rewritten while we waited are read back
+                db.session.rollback()
+                if not self.apply_batch():
+                    return
+
+    def apply_batch(self):
+        """Apply the oldest queued submissions in one transaction; returns how many were handled"""
+        submissions = db.session.scalars(
+            select(GameSubmission).where(GameSubmission.status == 'queued')
+            .order_by(GameSubmission.id).limit(self.batch_size)
+        ).all()
+        if not submissions:
+            return 0
+        try:
+            updated = self._apply(submissions)
+        except Exception:
+            db.session.rollback()
+            if len(submissions) == 1:
+                self.app.logger.exception('Submission %d failed', submissions[0].id)
+                self._fail(submissions[0], 'Could not apply game')
+                db.session.commit()
+                updated = []
+            else:
+                # Isolate the bad submission so the rest of the batch still goes through
+                updated = {}
+                for submission in submissions:
+                    updated.update((p.id, p) for p in self._apply_one(submission))
+                updated = list(updated.values())
+
+        if updated:
+            self.publish(updated=updated)
+        with self._applied:
+            self._applied.notify_all()
+        if updated and checkpoint_due(db.session):
+            write_checkpoint(db.session)
+            db.session.commit()
+        return len(submissions)
+
+    def _apply_one(self, submission):
+        try:
+            return self._apply([submission])
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception('Submission %d failed', submission.id)
+            self._fail(submission, 'Could not apply game')
+            db.session.commit()
+            return []
+
+    def _fail(self, submission, error):
+        submission.status = 'failed'
+        submission.error = error
+        submission.processed_at = datetime.utcnow()
+
+    def _apply(self, submissions):
+        """Rate and insert the submissions in order and commit; returns the updated players"""
+        payloads = [json.loads(submission.payload)['results'] for submission in submissions]
+        player_ids = {r['player_id'] for results in payloads for r in results}
+        players = {p.id: p for p in db.session.scalars(select(Player).where(Player.id.in_(player_ids)))}
+
+        accepted, games = [], []
+        for submission, results in zip(submissions, payloads):
+            missing = [r['player_id'] for r in results if r['player_id'] not in players]
+            if missing:
+                self._fail(submission, f'Player {missing[0]} not found')
+                continue
+            accepted.append(submission)
+            games.append([{'player': players[r['player_id']], 'placement': r['placement'], 'points': r['points']}
+                          for r in results])
+
+        histogram_before = rating_buckets((p.region_id, p.mu) for p in players.values())
+        updated = {}
+        created, seats = [], []
+        for processed in rating_system.process_many(games):
+            game = Game(num_players=len(processed))
+            for res in processed:
+                player = res['player']
+                game.participants.append(GameParticipant(
+                    player_id=player.id,
+                    placement=res['placement'],
+                    points=res['points'],
+                    mu_before=res['mu_before'],
+                    sigma_before=res['sigma_before'],
+                    mu_after=res['mu_after'],
+                    sigma_after=res['sigma_after']
+                ))
+                player.record_result(res['placement'], res['points'], res['mu_after'], res['sigma_after'])
+                updated[player.id] = player
+            db.session.add(game)
+            created.append(game)
+            seats.append([(res['player'].id, res['placement'], res['mu_after'] - res['mu_before']) for res in processed])
+        db.session.flush()
+        apply_deltas(db.session, pair_deltas(seats))
+        record_region_games(db.session, [(game.played_at, [(p.player_id, p.points) for p in game.participants])
+                                         for game in created])
+        update_histogram(db.session, histogram_before,
+                         rating_buckets((p.region_id, p.mu) for p in players.values()))
+
+        now = datetime.utcnow()
+        for submission, game in zip(accepted, created):
+            submission.status = 'applied'
+            submission.game_id = game.id
+            submission.processed_at = now
+        db.session.commit()
+        return list(updated.values())
+
+
+# Global submission queue instance
+submission_queue = SubmissionQueue(batch_size=Config.SUBMISSION_BATCH_SIZE,
+                                   poll_interval=Config.SUBMISSION_POLL_INTERVAL)
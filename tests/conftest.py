@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Config is read at import, so point the app at a scratch database first
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='splendor_tests_'), 'test.db')
+os.environ.setdefault('RESPONSE_CACHE_ENABLED', '0')
+os.environ.setdefault('LEADERBOARD_SNAPSHOT', '0')
+os.environ.setdefault('GAME_CACHE_SIZE', '0')
+os.environ.setdefault('RESPONSE_CACHE_VERSION_TTL', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
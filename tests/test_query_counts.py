@@ -0,0 +1,93 @@
+"""
+Query-count regression tests for the read endpoints.
+
+Every endpoint is requested at two data sizes; the number of SQL
+statements it runs must not change, so an N+1 lazy load fails here.
+"""
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import app
+from models import db, Player, Game, GameParticipant, Region
+
+ENDPOINTS = [
+    '/api/players',
+    '/api/leaderboard',
+    '/api/leaderboard?region_id=1',
+    '/api/players/1',
+    '/api/players/1/rivals',
+    '/api/games?limit=20',
+]
+
+
+def add_data(num_players, num_games, rng):
+    """Add players spread over new regions (so lazy region loads scale too) and games that include player 1"""
+    start = Player.query.count()
+    regions = [Region(name=f'Region {start + i}') for i in range(num_players // 4)]
+    db.session.add_all(regions)
+    players = [Player(name=f'Player {start + i}', region=regions[i % len(regions)], mu=rng.uniform(400, 800),
+                      sigma=100, games_played=0)
+               for i in range(num_players)]
+    db.session.add_all(players)
+    db.session.flush()
+    everyone = Player.query.all()
+    first = db.session.get(Player, 1)
+    played_at = datetime(2024, 1, 1)
+    for i in range(num_games):
+        seats = [first] + rng.sample([p for p in everyone if p.id != 1], 3)
+        game = Game(num_players=len(seats), played_at=played_at + timedelta(hours=Game.query.count() + i))
+        for placement, player in enumerate(seats, 1):
+            game.participants.append(GameParticipant(
+                player=player, placement=placement, points=16 - placement,
+                mu_before=player.mu, sigma_before=player.sigma, mu_after=player.mu, sigma_after=player.sigma
+            ))
+            player.add_result(placement, 16 - placement)
+        db.session.add(game)
+    db.session.commit()
+
+
+def count_queries(client, path):
+    """Statements this thread runs while serving `path` (the submission writer polls on its own thread)"""
+    statements = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, path
+    return len(statements)
+
+
+@pytest.fixture(scope='module')
+def counts():
+    """Query counts per endpoint with a small and a ten times larger database"""
+    rng = random.Random(0)
+    client = app.test_client()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    sizes = []
+    for num_players, num_games in ((8, 20), (72, 180)):
+        with app.app_context():
+            add_data(num_players, num_games, rng)
+        client.get('/api/regions')  # warm up connections and reflection outside the measurement
+        sizes.append({path: count_queries(client, path) for path in ENDPOINTS})
+    return sizes
+
+
+@pytest.mark.parametrize('path', ENDPOINTS)
+def test_query_count_does_not_grow_with_data(counts, path):
+    small, large = counts
+    assert large[path] == small[path]
@@ -0,0 +1,26 @@
+"""rate_many must agree with openskill's own PlackettLuce.rate"""
+import random
+
+import numpy as np
+import pytest
+
+from rating_system import rating_system
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rate_many_matches_openskill(seed):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(50):
+        size = rng.randint(2, 4)
+        # Placements drawn with repetition so ties are covered too
+        games.append([(rng.uniform(600, 1400), rng.uniform(30, 340), rng.randint(1, size)) for _ in range(size)])
+
+    flat = [seat for game in games for seat in game]
+    new_mu, new_sigma = rating_system.rate_many([mu for mu, _, _ in flat], [sigma for _, sigma, _ in flat],
+                                                [rank for _, _, rank in flat], [len(game) for game in games])
+
+    expected = [rating for game in games for rating in rating_system.calculate_new_ratings(
+        [(mu, sigma) for mu, sigma, _ in game], [rank for _, _, rank in game])]
+    assert np.allclose(new_mu, [mu for mu, _ in expected], rtol=0, atol=1e-9)
+    assert np.allclose(new_sigma, [sigma for _, sigma in expected], rtol=0, atol=1e-9)
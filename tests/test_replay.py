@@ -0,0 +1,71 @@
+"""
+The dependency-cone rewrite behind game edits and deletes must leave
+history exactly as a full replay would.
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app
+from models import db, Player, Game, GameParticipant, Region
+from replay import recompute_ratings, rewrite_game
+
+
+@pytest.fixture
+def history():
+    """Ids of a few dozen games between 12 players, rated by a full replay"""
+    rng = random.Random(7)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        region = Region(name='Replay')
+        players = [Player(name=f'Replay {i}', region=region, mu=1000, sigma=100, games_played=0) for i in range(12)]
+        db.session.add_all(players)
+        for i in range(40):
+            game = Game(num_players=0, played_at=datetime(2024, 1, 1) + timedelta(hours=i))
+            for placement, player in enumerate(rng.sample(players, rng.randint(2, 4)), 1):
+                game.participants.append(GameParticipant(
+                    player=player, placement=placement, points=16 - placement,
+                    mu_before=0, sigma_before=0, mu_after=0, sigma_after=0
+                ))
+            game.num_players = len(game.participants)
+            db.session.add(game)
+        db.session.commit()
+        recompute_ratings()
+        yield [game_id for game_id, in db.session.query(Game.id).order_by(Game.played_at, Game.id)]
+        db.session.remove()
+
+
+def assert_matches_full_replay():
+    summary = recompute_ratings(dry_run=True)
+    assert summary['participants_changed'] == 0
+    assert summary['players_changed'] == 0
+
+
+def test_edit_matches_full_replay(history):
+    with app.app_context():
+        game_id = history[3]
+        rows = GameParticipant.query.filter_by(game_id=game_id).order_by(GameParticipant.placement).all()
+        results = [{'player_id': row.player_id, 'placement': placement, 'points': row.points}
+                   for placement, row in enumerate(reversed(rows), 1)]
+        summary = rewrite_game(game_id, results=results)
+        assert summary['affected_games']
+        assert_matches_full_replay()
+
+
+def test_moving_a_game_matches_full_replay(history):
+    with app.app_context():
+        game_id = history[5]
+        rows = GameParticipant.query.filter_by(game_id=game_id).all()
+        results = [{'player_id': row.player_id, 'placement': row.placement, 'points': row.points} for row in rows]
+        rewrite_game(game_id, results=results, played_at=datetime(2024, 1, 2, 6, 30))
+        assert_matches_full_replay()
+
+
+def test_delete_matches_full_replay(history):
+    with app.app_context():
+        summary = rewrite_game(history[2])
+        assert db.session.get(Game, history[2]) is None
+        assert summary['affected_players']
+        assert_matches_full_replay()